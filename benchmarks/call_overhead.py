@@ -0,0 +1,85 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Measure per-call overhead of :class:`subreg.Api` against the offline stub
+server, comparing the zeep service proxy (`getattr(client.service, ...)`)
+with the precompiled call plans used by `Api._request`.
+
+Usage::
+
+    python benchmarks/call_overhead.py --calls 5000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub import stub_api, write_stub_cassette  # noqa: E402
+
+
+def proxy_plan(api):
+    """Resolve command through the service proxy on every call, as before"""
+
+    def plan(command):
+        method = getattr(api.client.service, command)
+        return lambda kwargs: method(**kwargs)
+
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stub.cassette.gz")
+        write_stub_cassette(
+            path,
+            [("Login", {"ssid": "stub"}), ("Check_Domain", {"avail": 1})],
+        )
+        api = stub_api(path)
+        proxy_api = stub_api(path)
+        proxy_api._plan = proxy_plan(proxy_api)
+        for name, call in (
+            ("service proxy", lambda: proxy_api.check_domain("example.cz")),
+            ("call plan", lambda: api.check_domain("example.cz")),
+        ):
+            best = None
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                for _ in range(args.calls):
+                    call()
+                elapsed = (time.perf_counter() - start) / args.calls
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"{name:<16}{best * 1e6:>10.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
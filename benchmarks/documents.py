@@ -0,0 +1,101 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Compare peak memory of naive and chunked base64 handling of documents.
+
+Usage::
+
+    python benchmarks/documents.py --size 20
+"""
+
+import argparse
+import base64
+import os
+import tempfile
+import time
+import tracemalloc
+
+from subreg.documents import decode_document, encode_document
+
+
+def naive_encode(path):
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("ascii")
+
+
+def chunked_encode(path):
+    with open(path, "rb") as f:
+        return encode_document(f)
+
+
+def naive_decode(document, path):
+    with open(path, "wb") as f:
+        f.write(base64.b64decode(document))
+
+
+def chunked_decode(document, path):
+    with open(path, "wb") as f:
+        decode_document(document, f)
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=20, help="Document size in MB")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "document.bin")
+        target = os.path.join(tmp, "copy.bin")
+        with open(source, "wb") as f:
+            for _ in range(args.size):
+                f.write(os.urandom(1024 * 1024))
+        with open(source, "rb") as f:
+            document = base64.b64encode(f.read()).decode("ascii")
+
+        print(f"{'operation':<18}{'peak MB':>10}{'time s':>10}")
+        for name, func, func_args in (
+            ("naive encode", naive_encode, (source,)),
+            ("chunked encode", chunked_encode, (source,)),
+            ("naive decode", naive_decode, (document, target)),
+            ("chunked decode", chunked_decode, (document, target)),
+        ):
+            result, peak, elapsed = measure(func, *func_args)
+            if result is not None:
+                assert result == document
+            print(f"{name:<18}{peak / 2**20:>10.1f}{elapsed:>10.3f}")
+            del result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Replay a recorded cassette (see :mod:`subreg.cassette`) offline and profile
+an :class:`subreg.Api` call against it.
+
+Record a cassette::
+
+    >>> from subreg import Api
+    >>> from subreg.cassette import RecordingTransport
+    >>> transport = RecordingTransport("run.cassette.gz")
+    >>> Api(username, password, transport=transport).set_google_mx_records(
+    ...     "example.com")
+    >>> transport.close()
+
+Replay it with original latency and profile it::
+
+    python benchmarks/replay.py run.cassette.gz set_google_mx_records \
+        example.com --latency 1 --profile
+
+Without a cassette, a synthetic zone from :mod:`stub` is used.
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub import WSDL_URL, write_stub_cassette, zone  # noqa: E402
+
+from subreg import Api  # noqa: E402
+from subreg.cassette import ReplayTransport  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("cassette", nargs="?", help="Cassette file")
+    parser.add_argument("method", nargs="?", default="set_google_mx_records")
+    parser.add_argument("args", nargs="*", default=None)
+    parser.add_argument("--wsdl", default="https://subreg.cz/wsdl")
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--profile", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.cassette is None:
+            args.cassette = os.path.join(tmp, "stub.cassette.gz")
+            args.wsdl = WSDL_URL
+            args.args = args.args or ["example.com"]
+            write_stub_cassette(
+                args.cassette,
+                [("Login", {"ssid": "stub"})]
+                + [("Get_DNS_Zone", {"records": zone(args.records)})]
+                + [("Delete_DNS_Record", {})]
+                + [("Add_DNS_Record", {"record_id": 1})],
+                elapsed=0.05,
+            )
+
+        transport = ReplayTransport(args.cassette, latency=args.latency)
+        api = Api(wsdl=args.wsdl, transport=transport)
+        api.login("replay", "replay")
+        method = getattr(api, args.method)
+
+        profiler = cProfile.Profile() if args.profile else None
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        method(*args.args)
+        if profiler:
+            profiler.disable()
+        print(f"{args.method}: {time.perf_counter() - start:.3f} s")
+        if profiler:
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Compare serialization of zeep responses with `zeep.helpers.serialize_object`
+followed by `json.dumps` and with :mod:`subreg.serializers`.
+
+Usage::
+
+    python benchmarks/serializers.py --records 5000 --repeat 20
+"""
+
+import argparse
+import datetime
+import decimal
+import json
+import time
+
+from zeep import xsd
+from zeep.helpers import serialize_object
+
+from subreg.serializers import from_json, from_msgpack, msgpack, to_json, to_msgpack
+
+Record = xsd.ComplexType(
+    xsd.Sequence(
+        [
+            xsd.Element("id", xsd.Integer()),
+            xsd.Element("name", xsd.String()),
+            xsd.Element("type", xsd.String()),
+            xsd.Element("content", xsd.String()),
+            xsd.Element("prio", xsd.Integer()),
+            xsd.Element("ttl", xsd.Integer()),
+        ]
+    )
+)
+
+Domain = xsd.ComplexType(
+    xsd.Sequence(
+        [
+            xsd.Element("name", xsd.String()),
+            xsd.Element("expire", xsd.Date()),
+            xsd.Element("autorenew", xsd.Integer()),
+            xsd.Element("price", xsd.Decimal()),
+        ]
+    )
+)
+
+
+def zone(count):
+    return {
+        "records": [
+            Record(
+                id=i,
+                name=f"host{i}",
+                type="TXT",
+                content=f"v=spf1 include:_spf{i}.example.com ~all",
+                prio=0,
+                ttl=3600,
+            )
+            for i in range(count)
+        ]
+    }
+
+
+def domains(count):
+    expire = datetime.date(2030, 1, 1)
+    return {
+        "count": count,
+        "domains": [
+            Domain(
+                name=f"domain{i}.cz",
+                expire=expire,
+                autorenew=1,
+                price=decimal.Decimal("199.00"),
+            )
+            for i in range(count)
+        ],
+    }
+
+
+def baseline(value):
+    return json.dumps(serialize_object(value), default=str).encode("utf-8")
+
+
+def timeit(func, value, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(value)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    methods = [
+        ("serialize_object+json", baseline, json.loads),
+        ("to_json", to_json, from_json),
+    ]
+    if msgpack is not None:
+        methods.append(("to_msgpack", to_msgpack, from_msgpack))
+
+    print(
+        f"{'payload':<14}{'method':<24}{'encode ms':>10}{'decode ms':>10}{'bytes':>10}"
+    )
+    for name, value in (
+        ("get_dns_zone", zone(args.records)),
+        ("domains_list", domains(args.records)),
+    ):
+        for method, encode, decode in methods:
+            encode_time, data = timeit(encode, value, args.repeat)
+            decode_time, _ = timeit(decode, data, args.repeat)
+            print(
+                f"{name:<14}{method:<24}{encode_time * 1000:>10.2f}"
+                f"{decode_time * 1000:>10.2f}{len(data):>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
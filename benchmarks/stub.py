@@ -0,0 +1,253 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Offline stand-in for the Subreg SOAP endpoint used by the benchmarks.
+
+Builds a document/literal WSDL describing a subset of the Subreg commands
+with the same response shape (`status`, `data`, `error`) and a cassette
+of synthetic responses, which :class:`subreg.cassette.ReplayTransport`
+serves without any network access.
+"""
+
+from xml.sax.saxutils import escape
+
+from subreg import Api
+from subreg.cassette import ReplayTransport, write_cassette
+
+WSDL_URL = "https://stub.subreg.invalid/wsdl"
+ENDPOINT = "https://stub.subreg.invalid/soap"
+NS = "http://stub.subreg.invalid/soap"
+
+# command -> XSD sequence of its `data` element
+DATA_TYPES = {
+    "Login": '<xsd:element name="ssid" type="xsd:string" minOccurs="0"/>',
+    "Check_Domain": (
+        '<xsd:element name="name" type="xsd:string" minOccurs="0"/>'
+        '<xsd:element name="avail" type="xsd:int" minOccurs="0"/>'
+    ),
+    "Get_DNS_Zone": (
+        '<xsd:element name="domain" type="xsd:string" minOccurs="0"/>'
+        '<xsd:element name="records" type="tns:Record" minOccurs="0" '
+        'maxOccurs="unbounded"/>'
+    ),
+    "Add_DNS_Record": ('<xsd:element name="record_id" type="xsd:int" minOccurs="0"/>'),
+    "Delete_DNS_Record": "",
+    "Get_Credit": ('<xsd:element name="credit" type="xsd:decimal" minOccurs="0"/>'),
+}
+
+RECORD_FIELDS = (
+    ("id", "xsd:int"),
+    ("name", "xsd:string"),
+    ("type", "xsd:string"),
+    ("content", "xsd:string"),
+    ("prio", "xsd:int"),
+    ("ttl", "xsd:int"),
+)
+
+REQUEST_FIELDS = (
+    ("ssid", "xsd:string"),
+    ("login", "xsd:string"),
+    ("password", "xsd:string"),
+    ("domain", "xsd:string"),
+    ("record", "tns:Record"),
+)
+
+
+def _elements(fields):
+    return "".join(
+        f'<xsd:element name="{name}" type="{_type}" minOccurs="0"/>'
+        for name, _type in fields
+    )
+
+
+def wsdl():
+    """Return WSDL document of the stub service"""
+    types = [
+        f'<xsd:complexType name="Record"><xsd:sequence>'
+        f"{_elements(RECORD_FIELDS)}</xsd:sequence></xsd:complexType>",
+        '<xsd:complexType name="ErrorCode"><xsd:sequence>'
+        '<xsd:element name="major" type="xsd:int"/>'
+        '<xsd:element name="minor" type="xsd:int"/>'
+        "</xsd:sequence></xsd:complexType>",
+        '<xsd:complexType name="Error"><xsd:sequence>'
+        '<xsd:element name="errormsg" type="xsd:string"/>'
+        '<xsd:element name="errorcode" type="tns:ErrorCode"/>'
+        "</xsd:sequence></xsd:complexType>",
+        f'<xsd:complexType name="Request"><xsd:sequence>'
+        f"{_elements(REQUEST_FIELDS)}</xsd:sequence></xsd:complexType>",
+    ]
+    messages, operations, bindings = [], [], []
+    for command, data in DATA_TYPES.items():
+        types.append(
+            f'<xsd:complexType name="{command}_Data"><xsd:sequence>{data}'
+            f"</xsd:sequence></xsd:complexType>"
+            f'<xsd:element name="{command}" type="tns:Request"/>'
+            f'<xsd:element name="{command}_Response"><xsd:complexType>'
+            f'<xsd:sequence><xsd:element name="status" type="xsd:string"/>'
+            f'<xsd:element name="data" type="tns:{command}_Data" minOccurs="0"/>'
+            f'<xsd:element name="error" type="tns:Error" minOccurs="0"/>'
+            f"</xsd:sequence></xsd:complexType></xsd:element>"
+        )
+        messages.append(
+            f'<wsdl:message name="{command}_In">'
+            f'<wsdl:part name="parameters" element="tns:{command}"/></wsdl:message>'
+            f'<wsdl:message name="{command}_Out">'
+            f'<wsdl:part name="parameters" element="tns:{command}_Response"/>'
+            f"</wsdl:message>"
+        )
+        operations.append(
+            f'<wsdl:operation name="{command}">'
+            f'<wsdl:input message="tns:{command}_In"/>'
+            f'<wsdl:output message="tns:{command}_Out"/></wsdl:operation>'
+        )
+        bindings.append(
+            f'<wsdl:operation name="{command}">'
+            f'<soap:operation soapAction="{NS}#{command}"/>'
+            f'<wsdl:input><soap:body use="literal"/></wsdl:input>'
+            f'<wsdl:output><soap:body use="literal"/></wsdl:output>'
+            f"</wsdl:operation>"
+        )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<wsdl:definitions xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/" '
+        'xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" '
+        'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+        f'xmlns:tns="{NS}" targetNamespace="{NS}">'
+        f'<wsdl:types><xsd:schema targetNamespace="{NS}" '
+        f'elementFormDefault="qualified">{"".join(types)}</xsd:schema>'
+        f'</wsdl:types>{"".join(messages)}'
+        f'<wsdl:portType name="SubregPort">{"".join(operations)}</wsdl:portType>'
+        '<wsdl:binding name="SubregBinding" type="tns:SubregPort">'
+        '<soap:binding style="document" '
+        'transport="http://schemas.xmlsoap.org/soap/http"/>'
+        f'{"".join(bindings)}</wsdl:binding>'
+        '<wsdl:service name="Subreg"><wsdl:port name="SubregPort" '
+        f'binding="tns:SubregBinding"><soap:address location="{ENDPOINT}"/>'
+        "</wsdl:port></wsdl:service></wsdl:definitions>"
+    )
+
+
+def to_xml(value):
+    """Serialize dict into child elements, lists into repeated elements"""
+    if not isinstance(value, dict):
+        return escape(str(value))
+    elements = []
+    for key, item in value.items():
+        for item in item if isinstance(item, list) else [item]:
+            elements.append(f"<tns:{key}>{to_xml(item)}</tns:{key}>")
+    return "".join(elements)
+
+
+def response(command, data=None, error=None):
+    """
+    Return SOAP response of `command` with `data` dict, or with
+    `error` tuple (message, major, minor)
+    """
+    if error:
+        message, major, minor = error
+        body = (
+            "<tns:status>error</tns:status><tns:error>"
+            f"<tns:errormsg>{escape(message)}</tns:errormsg><tns:errorcode>"
+            f"<tns:major>{major}</tns:major><tns:minor>{minor}</tns:minor>"
+            "</tns:errorcode></tns:error>"
+        )
+    else:
+        body = f"<tns:status>ok</tns:status><tns:data>{to_xml(data or {})}</tns:data>"
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/">'
+        f'<soap-env:Body><tns:{command}_Response xmlns:tns="{NS}">{body}'
+        f"</tns:{command}_Response></soap-env:Body></soap-env:Envelope>"
+    )
+
+
+def zone(count, mx=5):
+    """Return synthetic zone of `count` TXT/A records and `mx` MX records"""
+    records = []
+    for i in range(count):
+        if i % 2:
+            record = dict(
+                name=f"host{i}", type="A", content=f"10.0.{i // 256 % 256}.{i % 256}"
+            )
+        else:
+            record = dict(
+                name=f"_txt{i}",
+                type="TXT",
+                content=f"v=spf1 include:_spf{i}.example.com ~all",
+            )
+        records.append(dict(id=i + 1, **record, prio=0, ttl=3600))
+    for i in range(mx):
+        records.append(
+            dict(
+                id=count + i + 1,
+                name="",
+                type="MX",
+                content=f"mx{i}.example.com",
+                prio=10,
+                ttl=3600,
+            )
+        )
+    return records
+
+
+def write_stub_cassette(path, responses, elapsed=0.0):
+    """
+    Write cassette serving the stub WSDL and `responses`.
+
+    :param str path: Cassette file
+    :param list responses: (command, data) tuples, or (command, data, error)
+    :param float elapsed: Recorded duration of every call
+    """
+    interactions = [
+        {
+            "kind": "load",
+            "url": WSDL_URL,
+            "status": 200,
+            "headers": {},
+            "content": wsdl(),
+            "elapsed": 0.0,
+        }
+    ]
+    for command, *args in responses:
+        interactions.append(
+            {
+                "kind": "post",
+                "url": ENDPOINT,
+                "operation": command,
+                "request": "",
+                "status": 200,
+                "headers": {"Content-Type": "text/xml; charset=utf-8"},
+                "content": response(command, *args),
+                "elapsed": elapsed,
+            }
+        )
+    write_cassette(path, interactions)
+
+
+def stub_api(path, latency=0, login=True):
+    """Return :class:`subreg.Api` replaying cassette at `path`"""
+    api = Api(wsdl=WSDL_URL, transport=ReplayTransport(path, latency=latency))
+    if login:
+        api.login("stub", "stub")
+    return api
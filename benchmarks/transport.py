@@ -0,0 +1,103 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Compare bytes on the wire and wall-clock time of large responses with and
+without negotiated gzip/deflate compression.
+
+Usage::
+
+    SUBREG_USERNAME=... SUBREG_PASSWORD=... python benchmarks/transport.py \
+        --domain example.com --repeat 5
+"""
+
+import argparse
+import os
+import time
+
+from zeep.transports import Transport
+
+from subreg import Api
+
+
+class CountingTransport(Transport):
+    """Transport recording compressed and decoded response sizes"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.wire_bytes = 0
+        self.body_bytes = 0
+
+    def post(self, address, message, headers):
+        response = super().post(address, message, headers)
+        self.body_bytes += len(response.content)
+        # number of bytes read from the socket, before decompression
+        self.wire_bytes += response.raw.tell()
+        return response
+
+
+def measure(username, password, compression, calls, repeat):
+    api = Api(compression=compression)
+    transport = CountingTransport(session=api.client.transport.session)
+    api.client.transport = transport
+    api.login(username, password)
+    results = {}
+    for name, call in calls:
+        transport.wire_bytes = transport.body_bytes = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            call(api)
+        elapsed = (time.perf_counter() - start) / repeat
+        results[name] = (
+            transport.wire_bytes // repeat,
+            transport.body_bytes // repeat,
+            elapsed,
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--username", default=os.environ.get("SUBREG_USERNAME"))
+    parser.add_argument("--password", default=os.environ.get("SUBREG_PASSWORD"))
+    parser.add_argument("--domain", help="Domain with a large DNS zone")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    calls = [
+        ("domains_list", lambda api: api.domains_list()),
+        ("list_documents", lambda api: api.list_documents()),
+    ]
+    if args.domain:
+        calls.append(("get_dns_zone", lambda api: api.get_dns_zone(args.domain)))
+
+    print(f"{'command':<16}{'mode':<10}{'wire B':>12}{'body B':>12}{'time s':>10}")
+    for compression in (False, True):
+        mode = "gzip" if compression else "identity"
+        results = measure(args.username, args.password, compression, calls, args.repeat)
+        for name, (wire, body, elapsed) in results.items():
+            print(f"{name:<16}{mode:<10}{wire:>12}{body:>12}{elapsed:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Compare peak memory of reading MX records of a large synthetic zone with
+`get_dns_zone` (whole zone parsed into zeep objects) and with the
+filtering `iter_dns_zone` reader, against the offline stub server.
+
+Each mode runs in its own process and reports growth of peak RSS, which
+includes memory allocated by lxml outside of the Python allocator.
+
+Usage::
+
+    python benchmarks/zone_memory.py --records 50000
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub import stub_api, write_stub_cassette, zone  # noqa: E402
+
+
+def peak_rss():
+    """Peak resident set size in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(mode, path):
+    # the replayed response body is loaded with the cassette, so only
+    # parsing is measured, as if the body was already downloaded
+    api = stub_api(path)
+    before = peak_rss()
+    start = time.perf_counter()
+    if mode == "get_dns_zone":
+        records = [r for r in api.get_dns_zone("example.com") if r["type"] == "MX"]
+    else:
+        records = list(api.iter_dns_zone("example.com", types=["MX"]))
+    elapsed = time.perf_counter() - start
+    print(f"{mode:<16}{len(records):>8}{peak_rss() - before:>12.1f}{elapsed:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--mode")
+    parser.add_argument("--cassette")
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.cassette)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "zone.cassette.gz")
+        write_stub_cassette(
+            path,
+            [
+                ("Login", {"ssid": "stub"}),
+                ("Get_DNS_Zone", {"records": zone(args.records)}),
+            ],
+        )
+        print(f"{'mode':<16}{'MX':>8}{'peak MB':>12}{'time s':>10}")
+        for mode in ("get_dns_zone", "iter_dns_zone"):
+            subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--cassette", path],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -22,5 +22,19 @@
 # OTHER DEALINGS IN THE SOFTWARE.
 
 # autoflake: skip_file
+from .accounting import *
 from .api import *
+from .autorenew import *
+from .batch import *
+from .contacts import *
+from .credit import *
+from .dns import *
+from .dropcatch import *
 from .exceptions import *
+from .journal import *
+from .keepalive import *
+from .migration import *
+from .nic import *
+from .provisioning import *
+from .transfers import *
+from .watcher import *
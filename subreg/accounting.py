@@ -0,0 +1,162 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import csv
+import datetime
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from subreg.batch import RateLimiter, submit_in_context
+from subreg.serializers import from_json, to_json
+from subreg.utils import get_value
+
+ACCOUNTING_FIELDS = ("date", "text", "order", "sum", "credit")
+
+
+def _date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value))
+
+
+def month_periods(from_date, to_date):
+    """Split inclusive date range into calendar month (start, end) tuples"""
+    start, end = _date(from_date), _date(to_date)
+    periods = []
+    while start <= end:
+        following = (start.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        periods.append((start, min(end, following - datetime.timedelta(days=1))))
+        start = following
+    return periods
+
+
+class AccountingExporter:
+    """
+    Export account statements over long date ranges.
+
+    The range is split into months fetched concurrently with
+    `Get_Accountings`. Months which already ended are final and cached in
+    `cache_dir`, so repeated exports only fetch the current month. Rows are
+    yielded month by month in date order, with at most `workers` months
+    held in memory.
+
+    :param Api api: Logged in API instance
+    :param str cache_dir: Directory for finalized months, no caching when
+        omitted
+    :param int workers: Maximum number of months fetched at once
+    :param float rate: Maximum number of calls per second
+    """
+
+    def __init__(self, api, cache_dir=None, workers=4, rate=None):
+        self.api = api
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.rate = RateLimiter(rate) if rate else None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, period):
+        start, end = period
+        return os.path.join(self.cache_dir, f"{start}_{end}.jsonl.gz")
+
+    def fetch(self, period, today=None):
+        """
+        Return rows of single (start, end) period, from cache when final.
+
+        :return list of dicts with :data:`ACCOUNTING_FIELDS`
+        """
+        today = today or datetime.date.today()
+        final = self.cache_dir and period[1] < today
+        if final:
+            path = self._cache_path(period)
+            if os.path.exists(path):
+                with gzip.open(path, "rb") as f:
+                    return [from_json(line) for line in f]
+
+        if self.rate:
+            self.rate.acquire()
+        rows = [
+            {field: get_value(row, field) for field in ACCOUNTING_FIELDS}
+            for row in self.api.get_accountings(*period)
+        ]
+
+        if final:
+            tmp = f"{path}.tmp"
+            with gzip.open(tmp, "wb") as f:
+                for row in rows:
+                    f.write(to_json(row) + b"\n")
+            os.replace(tmp, path)
+        return rows
+
+    def iter_rows(self, from_date, to_date):
+        """Iterate statement rows of inclusive date range in date order"""
+        periods = iter(month_periods(from_date, to_date))
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = []
+            for period in periods:
+                pending.append(submit_in_context(pool, self.fetch, period))
+                if len(pending) >= self.workers:
+                    break
+            while pending:
+                rows = pending.pop(0).result()
+                # keep at most `workers` months in flight
+                period = next(periods, None)
+                if period is not None:
+                    pending.append(submit_in_context(pool, self.fetch, period))
+                yield from rows
+
+    def iter_columns(self, from_date, to_date, batch_size=10000):
+        """
+        Iterate statements as column batches, dicts of field -> list of
+        values, with at most `batch_size` rows each.
+        """
+        columns = {field: [] for field in ACCOUNTING_FIELDS}
+        size = 0
+        for row in self.iter_rows(from_date, to_date):
+            for field in ACCOUNTING_FIELDS:
+                columns[field].append(row[field])
+            size += 1
+            if size >= batch_size:
+                yield columns
+                columns = {field: [] for field in ACCOUNTING_FIELDS}
+                size = 0
+        if size:
+            yield columns
+
+    def write_csv(self, fileobj, from_date, to_date):
+        """
+        Stream statements of inclusive date range into text `fileobj` as CSV.
+
+        :return int number of rows written
+        """
+        writer = csv.DictWriter(fileobj, fieldnames=ACCOUNTING_FIELDS)
+        writer.writeheader()
+        count = 0
+        for row in self.iter_rows(from_date, to_date):
+            writer.writerow(row)
+            count += 1
+        return count
@@ -22,24 +22,148 @@
 # OTHER DEALINGS IN THE SOFTWARE.
 
 
+import io
 import re
 
 from requests import Session
+from requests.adapters import HTTPAdapter
 from zeep import Client
 from zeep.transports import Transport
+from zeep.wsdl.utils import etree_to_string
 
+from subreg import profiling, tracing
+from subreg.dns import iter_zone_records, validate_record
+from subreg.documents import decode_document, encode_document
 from subreg.exceptions import ApiError
 
 
+def _host_params(ipv4, ipv6):
+    if not ipv4 and not ipv6:
+        raise TypeError
+    params = {}
+    if ipv4:
+        params["ipv4"] = list(ipv4)
+    if ipv6:
+        params["ipv6"] = list(ipv6)
+    return params
+
+
+class _CallPlan:
+    """
+    Subreg command resolved once per client: binding, operation and endpoint
+    options, so calls skip the service proxy lookup. Default SOAP headers
+    of the client are merged like the operation proxy does.
+    """
+
+    __slots__ = ("client", "binding", "options", "operation", "proxy", "command")
+
+    def __init__(self, client, command):
+        service = client.service
+        self.client = client
+        self.binding = service._binding
+        self.options = service._binding_options
+        self.operation = self.binding.get(command)
+        self.proxy = service[command]
+        self.command = command
+
+    def _headers(self, kwargs):
+        """Add `client.set_default_soapheaders` headers to `kwargs`"""
+        headers = self.proxy._merge_soap_headers(kwargs.get("_soapheaders"))
+        if headers:
+            kwargs["_soapheaders"] = headers
+        return kwargs
+
+    def __call__(self, kwargs):
+        return self.binding.send(
+            self.client, self.options, self.command, (), self._headers(kwargs)
+        )
+
+    def raw(self, kwargs):
+        """Send request and return HTTP response without parsing it"""
+        envelope, headers = self.binding._create(
+            self.command,
+            (),
+            self._headers(kwargs),
+            client=self.client,
+            options=self.options,
+        )
+        response = self.client.transport.post_xml(
+            self.options["address"], envelope, headers
+        )
+        if response.status_code != 200:
+            # let zeep raise the SOAP fault or transport error
+            self.binding.process_reply(self.client, self.operation, response)
+        return response
+
+    def prepare(self, kwargs):
+        """
+        Build and serialize the request envelope now, return callable which
+        only sends it and parses the reply
+        """
+        envelope, headers = self.binding._create(
+            self.command,
+            (),
+            self._headers(kwargs),
+            client=self.client,
+            options=self.options,
+        )
+        message = etree_to_string(envelope)
+        address = self.options["address"]
+
+        def send():
+            response = self.client.transport.post(address, message, headers)
+            return self.binding.process_reply(self.client, self.operation, response)
+
+        return send
+
+
+@tracing.trace_methods
 class Api:
     """
     Python wrapper around the subreg.cz SOAP API
     """
 
-    def __init__(self, username=None, password=None, wsdl="https://subreg.cz/wsdl"):
+    def __init__(
+        self,
+        username=None,
+        password=None,
+        wsdl="https://subreg.cz/wsdl",
+        session=None,
+        compression=True,
+        pool_size=10,
+        transport=None,
+    ):
+        """
+        :param str username: Username for login
+        :param str password: Password
+        :param str wsdl: WSDL location
+        :param session: Optional preconfigured :class:`requests.Session`
+        :param bool compression: Accept compressed responses (requests
+            default), False asks for uncompressed `identity` encoding
+        :param int pool_size: Number of keep-alive connections kept per host,
+            should be at least the number of threads sharing this instance
+        :param transport: Optional :class:`zeep.transports.Transport`, e.g.
+            :class:`subreg.cassette.RecordingTransport`
+        """
         self.ssid = None
-        session = Session()
-        self.client = Client(wsdl=wsdl, transport=Transport(session=session))
+        self.pool_size = pool_size
+        self._credentials = None
+        self._plans = {}
+        if transport is not None:
+            session = transport.session
+        if session is None:
+            session = Session()
+            if pool_size:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+        if not compression:
+            session.headers["Accept-Encoding"] = "identity"
+        tracing.instrument_session(session)
+        profiling.instrument_session(session)
+        if transport is None:
+            transport = Transport(session=session)
+        self.client = Client(wsdl=wsdl, transport=transport)
         if username and password:
             self.login(username, password)
 
@@ -54,6 +178,17 @@ class Api:
         """
         response = self._request("Login", {"login": username, "password": password})
         self.ssid = response["ssid"]
+        self._credentials = (username, password)
+
+    def relogin(self):
+        """
+        Login again with credentials of the last login, e.g. after the
+        session expired. The session ID is replaced only once the new one
+        is known, so concurrent calls keep using the old one until then.
+        """
+        if self._credentials is None:
+            raise Exception("Not logged in.")
+        self.login(*self._credentials)
 
     def check_domain(self, domain):
         """
@@ -131,19 +266,27 @@ class Api:
         """
         Create contact in Subreg DB
 
+        :param kwargs: Contact fields (name, surname, org, street, city,
+            pc, cc, phone, email, ...)
+
+        :return str ID of created contact
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Create_Contact
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        response = self._request("Create_Contact", {"contact": kwargs})
+        return response["contact_id"]
 
     def update_contact(self, **kwargs):
         """
         Update contact
 
+        :param kwargs: Contact fields, `id` of existing contact is required
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Update_Contact
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        if not kwargs.get("id"):
+            raise Exception("You must specify `id` when update contact.")
+        return self._request("Update_Contact", {"contact": kwargs})
 
     def info_contact(self, contact_id):
         """
@@ -152,9 +295,9 @@ class Api:
         :param int contact_id: ID of your querying contact
 
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Info_Contact
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        kwargs = {"contact": {"id": contact_id}}
+        return self._request("Info_Contact", kwargs)
 
     def contacts_list(self):
         """
@@ -171,10 +314,13 @@ class Api:
         :param int _id: ID for check availability
         :param str _object: contact, nsset, keyset (only CZ, EE)
 
+        :return bool True when the ID is free, False when the object exists
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Check_Object
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        kwargs = {"id": _id, "object": _object}
+        response = self._request("Check_Object", kwargs)
+        return True if response["avail"] == 1 else False
 
     def info_object(self, _id, _object):
         """
@@ -184,18 +330,27 @@ class Api:
         :param str _object: contact, nsset, keyset (only CZ, EE)
 
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Info_Object
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        kwargs = {"id": _id, "object": _object}
+        return self._request("Info_Object", kwargs)
 
-    def make_order(self, **kwargs):
+    def make_order(self, domain, _type, params=None):
         """
         Create a new order (CreateDomain, ModifyDomain, RenewDomain, ... )
 
+        :param str domain: Domain (or host) the order is for
+        :param str _type: Order type, e.g. `Create_Domain`, `ModifyNS_Domain`
+        :param dict params: Order parameters, see order type documentation
+
+        :return int ID of created order
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Make_Order
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        order = {"domain": domain, "type": _type}
+        if params:
+            order["params"] = params
+        response = self._request("Make_Order", {"order": order})
+        return response["orderid"]
 
     def info_order(self, order_id):
         """
@@ -204,9 +359,9 @@ class Api:
         :param int order_id: Order ID
 
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Info_Order
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        kwargs = {"order": order_id}
+        return self._request("Info_Order", kwargs)
 
     def get_credit(self):
         """
@@ -223,10 +378,21 @@ class Api:
         :param from_date: Date (YYYY-mm-dd)
         :param to_date: Date (YYYY-mm-dd)
 
+        :return list of statements
+            :key `date`: Date of the statement
+            :key `text`: Description
+            :key `order`: Order ID
+            :key `sum`: Amount
+            :key `credit`: Credit after the operation
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Get_Accountings
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        kwargs = {"from": str(from_date), "to": str(to_date)}
+        response = self._request("Get_Accountings", kwargs)
+        try:
+            return response["accounting"] or []
+        except KeyError:
+            return []
 
     def client_payment(self, username, amount, currency):
         """
@@ -239,9 +405,9 @@ class Api:
         :param str currency: Currency of added credit
 
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Client_Payment
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        kwargs = {"username": username, "amount": amount, "currency": currency}
+        return self._request("Client_Payment", kwargs)
 
     def credit_correction(self, username, amount, reason):
         """
@@ -255,9 +421,9 @@ class Api:
         :param str reason: Human readable reason for this operation
 
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Credit_Correction
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        kwargs = {"username": username, "amount": amount, "reason": reason}
+        return self._request("Credit_Correction", kwargs)
 
     def pricelist(self):
         """
@@ -303,18 +469,24 @@ class Api:
         """
         raise NotImplementedError
 
-    def download_document(self, document_id):
+    def download_document(self, document_id, fileobj=None):
         """
         Get document information and base64 encoded document that you have
         uploaded or generated on your account.
 
         :param int document_id: Document ID, you can get it in response of
                             `Upload_Document` or by `List_Documents`.
+        :param fileobj: Optional binary file object, the document is decoded
+                        into it chunk by chunk and removed from the response
 
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Download_Document
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        kwargs = {"id": document_id}
+        response = self._request("Download_Document", kwargs)
+        if fileobj is not None:
+            decode_document(response["document"], fileobj)
+            response["document"] = None
+        return response
 
     def upload_document(self, name, document, _type=None, filetype=None):
         """
@@ -322,15 +494,24 @@ class Api:
         registration request etc.
 
         :param str name: Filename of the document, including extension
-        :param str document: base64 encoded document
+        :param document: base64 encoded document (str), raw content (bytes)
+                         or binary file object, which is encoded chunk by chunk
         :param str _type: Type of the document
                      (https://soap.subreg.cz/manual/?cmd=Document_Types)
         :param str filetype: MIME type of the file
 
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Upload_Document
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        if isinstance(document, (bytes, bytearray)):
+            document = encode_document(io.BytesIO(document))
+        elif not isinstance(document, str):
+            document = encode_document(document)
+        kwargs = {"name": name, "document": document}
+        if _type:
+            kwargs["type"] = _type
+        if filetype:
+            kwargs["filetype"] = filetype
+        return self._request("Upload_Document", kwargs)
 
     def list_documents(self):
         """
@@ -363,6 +544,23 @@ class Api:
         except KeyError:
             return []
 
+    def iter_dns_zone(self, domain, types=None, names=None):
+        """
+        DNS records for specified domain, filtered while the response is
+        parsed, so only matching records of large zones are materialized.
+
+        :param str domain: Registered domain
+        :param list types: Record types to select, e.g. ``["MX"]``
+        :param list names: Record names to select, e.g. ``["", "www"]``
+
+        :return iterator of record dicts
+
+        .. seealso:: https://soap.subreg.cz/manual/?cmd=Get_DNS_Zone
+        """
+        kwargs = {"domain": domain}
+        response = self._request_raw("Get_DNS_Zone", kwargs)
+        return iter_zone_records(response.content, types=types, names=names)
+
     def add_dns_zone(self, domain, template=None):
         """
         Add domain to DNS using previously created template.
@@ -373,7 +571,7 @@ class Api:
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Add_DNS_Zone
         """
         kwargs = {"domain": domain}
-        if not template:
+        if template:
             kwargs["template"] = template
         try:
             self._request("Add_DNS_Zone", kwargs)
@@ -406,7 +604,7 @@ class Api:
         """
         raise NotImplementedError
 
-    def add_dns_record(self, domain, record):
+    def add_dns_record(self, domain, record, validate=False):
         """
         Add DNS record to zone.
 
@@ -419,12 +617,17 @@ class Api:
                 value,..)
             :key prio: Priority of this record (MX records only)
             :key ttl: TTL value
+        :param bool validate: Normalize and validate record locally before
+            sending it, see :func:`subreg.dns.validate_record`
 
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Add_DNS_Record
+        .. exception:: RecordValidationError when `validate` is set
         """
         if not isinstance(record, dict):
             raise TypeError
-            # remove leading .
+        if validate:
+            record = validate_record(record)
+        # remove leading .
         record["content"] = re.sub(r"\.$", "", record["content"])
         kwargs = {"domain": domain, "record": record}
         try:
@@ -498,9 +701,8 @@ class Api:
         :param int poll_id: POLL ID
 
         .. seealso:: https://soap.subreg.cz/manual/?cmd=POLL_Ack
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        return self._request("POLL_Ack", {"id": poll_id})
 
     def oib_search(self, oib):
         """
@@ -527,50 +729,74 @@ class Api:
         """
         raise NotImplementedError
 
-    def transfer_domain(self):
+    def transfer_domain(self, domain, authid=None, params=None):
         """
         Transfer domain between two registrars or two account
 
+        :param str domain: Domain to transfer
+        :param str authid: Authorization (EPP) code
+        :param dict params: Other order parameters
+
+        :return int order ID
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Transfer_Domain
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        params = dict(params or {})
+        if authid:
+            params["authid"] = authid
+        return self.make_order(domain, "Transfer_Domain", params)
 
-    def account_transfer_domain(self):
+    def account_transfer_domain(self, domain, params=None):
         """
         Transfer domain between two Subreg.CZ accounts.
 
+        :param str domain: Domain to transfer
+        :param dict params: Order parameters
+
+        :return int order ID
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=AccountTransfer_Domain
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        return self.make_order(domain, "AccountTransfer_Domain", params)
 
-    def transfer_approve_domain(self):
+    def transfer_approve_domain(self, domain, params=None):
         """
         Transfer Approve domain between two registrars
 
+        :param str domain: Domain transferred away
+        :param dict params: Order parameters
+
+        :return int order ID
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=TransferApprove_Domain
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        return self.make_order(domain, "TransferApprove_Domain", params)
 
-    def transfer_deny_domain(self):
+    def transfer_deny_domain(self, domain, params=None):
         """
         Transfer Deny domain between two registrars
 
+        :param str domain: Domain transferred away
+        :param dict params: Order parameters
+
+        :return int order ID
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=TransferDeny_Domain
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        return self.make_order(domain, "TransferDeny_Domain", params)
 
-    def transfer_cancel_domain(self):
+    def transfer_cancel_domain(self, domain, params=None):
         """
         Transfer Cancel domain between two registrars
 
+        :param str domain: Domain being transferred
+        :param dict params: Order parameters
+
+        :return int order ID
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=TransferCancel_Domain
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        return self.make_order(domain, "TransferCancel_Domain", params)
 
     def sk_change_owner_domain(self):
         """
@@ -595,16 +821,28 @@ class Api:
         """
         raise NotImplementedError
 
-    def modify_ns_domain(self):
+    def modify_ns_domain(self, domain, hosts=None, nsset=None):
         """
         Modify existing domain to new values.
         For DNSSEC extension please see full
         specification `here <https://soap.subreg.cz/manual/?cmd=DNSSEC>`_.
 
+        :param str domain: Registered domain
+        :param list hosts: Nameserver hostnames
+        :param str nsset: NSSET ID, instead of `hosts` (CZ, EE)
+
+        :return int order ID
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=ModifyNS_Domain
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        if not hosts and not nsset:
+            raise TypeError
+        ns = {}
+        if hosts:
+            ns["hosts"] = [{"hostname": host} for host in hosts]
+        if nsset:
+            ns["nsset"] = nsset
+        return self.make_order(domain, "ModifyNS_Domain", {"ns": ns})
 
     def delete_domain(self):
         """
@@ -633,25 +871,33 @@ class Api:
         """
         raise NotImplementedError
 
-    def backorder_domain(self):
+    def backorder_domain(self, domain, params=None):
         """
         Create a backorder order. We will register domain after deletion
         from registry
 
+        :param str domain: Domain to catch
+        :param dict params: Order parameters (registrant, contacts, ns, ...)
+
+        :return int order ID
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Backorder_Domain
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        return self.make_order(domain, "Backorder_Domain", params)
 
-    def preregister_domain(self):
+    def preregister_domain(self, domain, params=None):
         """
         This order type is for new TLDs or liberation rules of existing TLDs
         domain pre-registration
 
+        :param str domain: Domain to pre-register
+        :param dict params: Order parameters (registrant, contacts, ns, ...)
+
+        :return int order ID
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Preregister_Domain
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        return self.make_order(domain, "Preregister_Domain", params)
 
     def create_object(self):
         """
@@ -691,45 +937,56 @@ class Api:
         """
         raise NotImplementedError
 
-    def create_host(self):
+    def create_host(self, host, ipv4=None, ipv6=None):
         """
         Create new delegated host object.
         It is possible to specify multiple IPv4 and IPv6 addresses of the host.
 
+        :param str host: Hostname, e.g. ns1.example.com
+        :param list ipv4: IPv4 addresses
+        :param list ipv6: IPv6 addresses
+
+        :return int order ID
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Create_Host
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        return self.make_order(host, "Create_Host", _host_params(ipv4, ipv6))
 
-    def update_host(self):
+    def update_host(self, host, ipv4=None, ipv6=None):
         """
         Change IP addresses of delegated host object.
 
+        :param str host: Hostname, e.g. ns1.example.com
+        :param list ipv4: New IPv4 addresses
+        :param list ipv6: New IPv6 addresses
+
+        :return int order ID
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Update_Host
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        return self.make_order(host, "Update_Host", _host_params(ipv4, ipv6))
 
-    def delete_host(self):
+    def delete_host(self, host):
         """
         Delete delegated host object.
         It is only possible to delete host when it is no longer used.
 
+        :param str host: Hostname, e.g. ns1.example.com
+
+        :return int order ID
+
         .. seealso:: https://soap.subreg.cz/manual/?cmd=Delete_Host
-        .. exception:: NotImplementedError
         """
-        raise NotImplementedError
+        return self.make_order(host, "Delete_Host")
 
     def set_google_mx_records(self, domain):
         """
         Set Google MX rerods.
         Specified records will replace ALL present MX records.
         """
-        records = self.get_dns_zone(domain)
-        for record in records:
-            # delete all mx records
-            if record["type"] == "MX":
-                self.delete_dns_record(domain, record["id"])
+        # delete all mx records
+        for record in list(self.iter_dns_zone(domain, types=["MX"])):
+            self.delete_dns_record(domain, record["id"])
 
         records = [
             dict(content="ASPMX.L.GOOGLE.COM.", prio=1),
@@ -743,24 +1000,75 @@ class Api:
             record["type"] = "MX"
             self.add_dns_record(domain, record)
 
+    def _plan(self, command):
+        """Return call plan of `command`, built on first use"""
+        plan = self._plans.get(command)
+        if plan is None or plan.client is not self.client:
+            plan = self._plans[command] = _CallPlan(self.client, command)
+        return plan
+
+    def _request_raw(self, command, kwargs=None):
+        """Make request, return unparsed HTTP response"""
+
+        if kwargs is None:
+            kwargs = dict()
+
+        if self.ssid:
+            kwargs["ssid"] = self.ssid
+
+        with tracing.span(
+            f"Subreg {command}", command=command, domain=kwargs.get("domain")
+        ), profiling.profile(command):
+            return self._plan(command).raw(kwargs)
+
     def _request(self, command, kwargs=None):
         """Make request parse response"""
 
         if kwargs is None:
             kwargs = dict()
 
-        if self.ssid:
+        # Login starts a new session, also when relogging an existing one
+        if self.ssid and command != "Login":
             kwargs["ssid"] = self.ssid
 
-        method = getattr(self.client.service, command)
-        response = method(**kwargs)
+        with tracing.span(
+            f"Subreg {command}", command=command, domain=kwargs.get("domain")
+        ) as span, profiling.profile(command):
+            response = self._plan(command)(kwargs)
+            return self._data(response, span)
 
+    def _data(self, response, span=None):
+        """Return data of parsed response, raise its error"""
         if response:
             if response["status"] == "error":
-                raise ApiError(
+                error = ApiError(
                     message=response["error"]["errormsg"],
                     major=response["error"]["errorcode"]["major"],
                     minor=response["error"]["errorcode"]["minor"],
                 )
+                tracing.record_error(span, error)
+                raise error
             return response["data"]
         raise Exception("Fatal error.")
+
+    def _prepare(self, command, kwargs=None):
+        """
+        Prebuild request of `command`, return callable sending it and
+        returning response data like :meth:`_request`. The session ID is
+        captured now, so prepare after login.
+        """
+        if kwargs is None:
+            kwargs = dict()
+
+        if self.ssid:
+            kwargs["ssid"] = self.ssid
+
+        send = self._plan(command).prepare(kwargs)
+
+        def request():
+            with tracing.span(
+                f"Subreg {command}", command=command, domain=kwargs.get("domain")
+            ) as span, profiling.profile(command):
+                return self._data(send(), span)
+
+        return request
@@ -0,0 +1,193 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import datetime
+from collections import namedtuple
+from fnmatch import fnmatch
+
+from subreg.batch import run_parallel
+from subreg.utils import get_value
+
+AUTORENEW_POLICIES = ("EXPIRE", "AUTORENEW", "RENEWONCE")
+
+# Domains_List reports the policy as a number
+_AUTORENEW_CODES = {0: "EXPIRE", 1: "AUTORENEW", 2: "RENEWONCE"}
+
+AutorenewChange = namedtuple("AutorenewChange", ["domain", "current", "target"])
+
+
+def expires_within(days, policy):
+    """
+    Rule matching domains which expire in `days` days or less.
+
+    :param int days: Expiry window in days
+    :param str policy: Autorenew policy for matching domains
+    """
+
+    def rule(domain, days_left):
+        if days_left is not None and days_left <= days:
+            return policy
+        return None
+
+    return rule
+
+
+def name_matches(pattern, policy):
+    """
+    Rule matching domain names by shell-style `pattern` (e.g. ``*.cz``).
+
+    :param str pattern: fnmatch pattern
+    :param str policy: Autorenew policy for matching domains
+    """
+
+    def rule(domain, days_left):
+        if fnmatch(domain["name"].lower(), pattern.lower()):
+            return policy
+        return None
+
+    return rule
+
+
+def _autorenew_policy(value):
+    if value is None:
+        return None
+    try:
+        return _AUTORENEW_CODES[int(value)]
+    except (TypeError, ValueError, KeyError):
+        value = str(value).upper()
+        return value if value in AUTORENEW_POLICIES else None
+
+
+def _days_left(expire, today):
+    if not expire:
+        return None
+    if isinstance(expire, datetime.datetime):
+        expire = expire.date()
+    elif not isinstance(expire, datetime.date):
+        try:
+            expire = datetime.date.fromisoformat(str(expire)[:10])
+        except ValueError:
+            return None
+    return (expire - today).days
+
+
+class AutorenewPlanner:
+    """
+    Compute and apply autorenew policy changes over the whole account.
+
+    The account is read once with `Domains_List`, every domain is matched
+    against `rules` (first match wins, `default` otherwise) and only domains
+    whose current policy differs are sent to `Set_Autorenew`.
+
+    :param Api api: Logged in API instance
+    :param list rules: Callables ``rule(domain, days_left)`` returning
+        a policy or None, see :func:`expires_within` and :func:`name_matches`
+    :param str default: Policy for domains matched by no rule, None keeps
+        current policy
+    :param int workers: Maximum number of concurrent `Set_Autorenew` calls
+    :param float rate: Maximum number of `Set_Autorenew` calls per second
+    :param AdaptiveLimiter limiter: Optional adaptive concurrency limit
+    """
+
+    def __init__(
+        self, api, rules=None, default=None, workers=8, rate=None, limiter=None
+    ):
+        if default is not None and default not in AUTORENEW_POLICIES:
+            raise ValueError(f"Unknown autorenew policy {default!r}.")
+        self.api = api
+        self.rules = list(rules or [])
+        self.default = default
+        self.workers = workers
+        self.rate = rate
+        self.limiter = limiter
+
+    def target(self, domain, today=None):
+        """Return policy the `domain` dict should have, or None"""
+        today = today or datetime.date.today()
+        days_left = _days_left(get_value(domain, "expire"), today)
+        for rule in self.rules:
+            policy = rule(domain, days_left)
+            if policy:
+                return policy
+        return self.default
+
+    def plan(self, domains=None, today=None):
+        """
+        Compute required changes.
+
+        :param list domains: Domains as returned by `Domains_List`, fetched
+            from the account when omitted
+
+        :return list of :class:`AutorenewChange`
+        """
+        if domains is None:
+            domains = get_value(self.api.domains_list(), "domains", [])
+        today = today or datetime.date.today()
+        changes = []
+        for domain in domains:
+            target = self.target(domain, today)
+            if target is None:
+                continue
+            if target not in AUTORENEW_POLICIES:
+                raise ValueError(f"Unknown autorenew policy {target!r}.")
+            current = _autorenew_policy(get_value(domain, "autorenew"))
+            if current != target:
+                changes.append(AutorenewChange(domain["name"], current, target))
+        return changes
+
+    def apply(self, changes=None):
+        """
+        Apply changes in parallel.
+
+        :param list changes: Result of :meth:`plan`, planned when omitted
+
+        :return dict
+            :key `changed`: list of applied :class:`AutorenewChange`
+            :key `failed`: list of (:class:`AutorenewChange`, error) tuples,
+                error is the :class:`subreg.ApiError` of the rejected change
+        """
+        if changes is None:
+            changes = self.plan()
+
+        def apply_change(change):
+            if change.target not in AUTORENEW_POLICIES:
+                raise ValueError(f"Unknown autorenew policy {change.target!r}.")
+            # unlike Api.set_autorenew keep the error for the report
+            self.api._request(
+                "Set_Autorenew", {"domain": change.domain, "autorenew": change.target}
+            )
+
+        report = {"changed": [], "failed": []}
+        for result in run_parallel(
+            apply_change,
+            changes,
+            workers=self.workers,
+            rate=self.rate,
+            limiter=self.limiter,
+        ):
+            if result.error is None:
+                report["changed"].append(result.item)
+            else:
+                report["failed"].append((result.item, result.error))
+        return report
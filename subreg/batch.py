@@ -0,0 +1,324 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import contextvars
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from subreg.exceptions import ApiError
+
+BatchResult = namedtuple("BatchResult", ["item", "result", "error"])
+
+LimitDecision = namedtuple("LimitDecision", ["time", "old", "new", "reason"])
+
+
+class RateLimiter:
+    """
+    Token bucket shared by worker threads, allowing at most `rate` calls
+    per second with bursts of up to `burst` calls.
+
+    :param float rate: Calls per second
+    :param int burst: Bucket size
+    """
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError("Rate must be positive.")
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit adjusted by AIMD (additive increase, multiplicative
+    decrease) from observed latency and errors.
+
+    The limit grows by one after `limit` consecutive healthy calls and is
+    multiplied by `decrease` when a call is throttled, fails with
+    a non-API error (timeout, connection error) or takes longer than
+    `tolerance` times the baseline latency. The limit is decreased at most
+    once per `limit` completed calls, so one burst of failures is not
+    counted many times.
+
+    :param int initial: Starting limit
+    :param int minimum: Lowest limit
+    :param int maximum: Highest limit, also the size of the thread pool
+    :param float decrease: Multiplier applied on overload
+    :param float tolerance: Latency / baseline ratio considered overload
+    :param throttle_codes: :class:`subreg.ApiError` major codes or
+        (major, minor) tuples signalling rate limiting
+    """
+
+    def __init__(
+        self,
+        initial=4,
+        minimum=1,
+        maximum=64,
+        decrease=0.5,
+        tolerance=2.0,
+        throttle_codes=(),
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.throttle_codes = set(throttle_codes)
+        self.limit = max(minimum, min(maximum, initial))
+        self.inflight = 0
+        self.completed = 0
+        self.throttled = 0
+        self.errors = 0
+        self.baseline = None
+        self.decisions = deque(maxlen=1000)
+        self._healthy = 0
+        self._since_decrease = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Block until a call fits under current limit"""
+        with self._condition:
+            while self.inflight >= self.limit:
+                self._condition.wait()
+            self.inflight += 1
+
+    def _is_throttle(self, error):
+        if isinstance(error, ApiError):
+            return (
+                error.major in self.throttle_codes
+                or (error.major, error.minor) in self.throttle_codes
+            )
+        return error is not None
+
+    def _set_limit(self, limit, reason):
+        limit = max(self.minimum, min(self.maximum, limit))
+        if limit != self.limit:
+            self.decisions.append(LimitDecision(time.time(), self.limit, limit, reason))
+            self.limit = limit
+
+    def release(self, latency, error=None):
+        """
+        Record finished call and adjust the limit.
+
+        :param float latency: Call duration in seconds
+        :param Exception error: Exception raised by the call, if any
+        """
+        with self._condition:
+            self.inflight -= 1
+            self.completed += 1
+            self._since_decrease += 1
+            throttled = self._is_throttle(error)
+            if error is not None:
+                self.errors += 1
+            if throttled:
+                self.throttled += 1
+            elif error is None:
+                # baseline follows the fastest calls, recovering slowly
+                if self.baseline is None or latency < self.baseline:
+                    self.baseline = latency
+                else:
+                    self.baseline += (latency - self.baseline) * 0.01
+
+            slow = error is None and latency > self.baseline * self.tolerance
+            if throttled or slow:
+                self._healthy = 0
+                if self._since_decrease >= self.limit:
+                    self._since_decrease = 0
+                    reason = "throttled" if throttled else "latency"
+                    self._set_limit(int(self.limit * self.decrease), reason)
+            elif error is None:
+                self._healthy += 1
+                if self._healthy >= self.limit:
+                    self._healthy = 0
+                    self._set_limit(self.limit + 1, "healthy")
+            self._condition.notify_all()
+
+    def metrics(self):
+        """Return current state as dict"""
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "inflight": self.inflight,
+                "completed": self.completed,
+                "errors": self.errors,
+                "throttled": self.throttled,
+                "baseline_latency": self.baseline,
+            }
+
+
+def _caller(func, rate, limiter):
+    """Wrap `func` into call returning :class:`BatchResult`"""
+    if rate is not None and not isinstance(rate, RateLimiter):
+        rate = RateLimiter(rate)
+
+    def call(item):
+        if limiter is not None:
+            limiter.acquire()
+        if rate is not None:
+            rate.acquire()
+        start = time.monotonic()
+        error = None
+        try:
+            return BatchResult(item, func(item), None)
+        except Exception as e:
+            error = e
+            return BatchResult(item, None, e)
+        finally:
+            if limiter is not None:
+                limiter.release(time.monotonic() - start, error)
+
+    # every call runs in a copy of the caller's context, so tracing spans
+    # opened by workers are children of the caller's span
+    context = contextvars.copy_context()
+    return lambda item: context.copy().run(call, item)
+
+
+def submit_in_context(pool, func, *args, **kwargs):
+    """
+    Submit `func(*args, **kwargs)` to executor `pool`, running it in a copy
+    of the caller's context like :func:`run_parallel` workers
+
+    :return :class:`concurrent.futures.Future`
+    """
+    return pool.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def run_parallel(func, items, workers=8, rate=None, limiter=None):
+    """
+    Call `func(item)` for every item using a pool of threads.
+
+    Exceptions raised by `func` are captured, so one failing item never
+    aborts the rest of the batch.
+
+    :param callable func: Function called with a single item
+    :param iterable items: Items to process
+    :param int workers: Maximum number of concurrent calls
+    :param rate: Optional calls per second limit or :class:`RateLimiter`
+    :param AdaptiveLimiter limiter: Optional adaptive concurrency limit,
+        `workers` is raised to its maximum
+
+    :return list of :class:`BatchResult` in the order of `items`
+    """
+    if limiter is not None:
+        workers = limiter.maximum
+    call = _caller(func, rate, limiter)
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(items)))) as pool:
+        return list(pool.map(call, items))
+
+
+def run_graph(func, dependencies, workers=8, rate=None, limiter=None):
+    """
+    Call `func(item)` for every item of a dependency graph using a pool of
+    threads. Each item starts as soon as all items it depends on succeeded,
+    so only dependent items are serialized. Items depending on a failed
+    item are skipped.
+
+    :param callable func: Function called with a single item
+    :param dict dependencies: Item -> iterable of items it depends on,
+        every item must be a key
+    :param int workers: Maximum number of concurrent calls
+    :param rate: Optional calls per second limit or :class:`RateLimiter`
+    :param AdaptiveLimiter limiter: Optional adaptive concurrency limit
+
+    :return tuple (list of :class:`BatchResult` in completion order,
+        list of skipped items)
+    """
+    waiting = {item: set(deps) for item, deps in dependencies.items()}
+    dependents = {item: [] for item in waiting}
+    for item, deps in waiting.items():
+        for dep in deps:
+            if dep not in dependents:
+                raise ValueError(f"Unknown dependency {dep!r} of {item!r}.")
+            dependents[dep].append(item)
+
+    # reject cycles before anything is sent
+    indegree = {item: len(deps) for item, deps in waiting.items()}
+    ready = [item for item, count in indegree.items() if not count]
+    visited = 0
+    while ready:
+        item = ready.pop()
+        visited += 1
+        for dependent in dependents[item]:
+            indegree[dependent] -= 1
+            if not indegree[dependent]:
+                ready.append(dependent)
+    if visited != len(waiting):
+        raise ValueError("Dependency graph contains a cycle.")
+
+    if limiter is not None:
+        workers = limiter.maximum
+    call = _caller(func, rate, limiter)
+    results, skipped = [], []
+
+    def skip(item):
+        for dependent in dependents[item]:
+            if dependent in waiting:
+                del waiting[dependent]
+                skipped.append(dependent)
+                skip(dependent)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        running = set()
+
+        def submit_ready():
+            for item in [item for item, deps in waiting.items() if not deps]:
+                del waiting[item]
+                running.add(pool.submit(call, item))
+
+        submit_ready()
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                results.append(result)
+                if result.error is None:
+                    for dependent in dependents[result.item]:
+                        if dependent in waiting:
+                            waiting[dependent].discard(result.item)
+                else:
+                    skip(result.item)
+            submit_ready()
+    return results, skipped
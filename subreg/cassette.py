@@ -0,0 +1,249 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import gzip
+import itertools
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+from lxml import etree
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from zeep.transports import Transport
+
+CASSETTE_VERSION = 1
+
+# elements never written to a cassette in plain text
+SECRET_ELEMENTS = ("password", "ssid")
+REDACTED = "REDACTED"
+
+
+def _redact(message):
+    """Replace values of secret elements (password, session ID)"""
+    try:
+        root = etree.fromstring(message.encode("utf-8"))
+    except (etree.XMLSyntaxError, ValueError):
+        return message
+    secrets = [
+        element
+        for element in root.iter(etree.Element)
+        if etree.QName(element).localname in SECRET_ELEMENTS
+    ]
+    if not secrets:
+        return message
+    for element in secrets:
+        for child in list(element):
+            element.remove(child)
+        element.text = REDACTED
+    return etree.tostring(root, encoding="unicode")
+
+
+def _operation(message):
+    """Return name of SOAP operation in request envelope"""
+    if isinstance(message, str):
+        message = message.encode("utf-8")
+    try:
+        envelope = etree.fromstring(message)
+    except (etree.XMLSyntaxError, ValueError):
+        return None
+    for body in envelope:
+        if etree.QName(body).localname == "Body":
+            for operation in body:
+                return etree.QName(operation).localname
+    return None
+
+
+def read_cassette(path):
+    """
+    Iterate interactions stored in cassette at `path`.
+
+    :return iterator of dicts
+        :key `kind`: `load` (WSDL, XSD) or `post` (SOAP call)
+        :key `url`: Requested URL
+        :key `operation`: SOAP operation of `post` interactions
+        :key `request`: Request envelope of `post` interactions
+        :key `status`: HTTP status code
+        :key `headers`: Response headers
+        :key `content`: Response body
+        :key `elapsed`: Original duration in seconds
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version {header!r}.")
+        for line in f:
+            yield json.loads(line)
+
+
+def write_cassette(path, interactions):
+    """
+    Write `interactions` (see :func:`read_cassette`) into cassette at `path`,
+    e.g. to build synthetic payloads for benchmarks.
+    """
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for interaction in itertools.chain(
+            [{"version": CASSETTE_VERSION}], interactions
+        ):
+            f.write(json.dumps(interaction, separators=(",", ":")))
+            f.write("\n")
+
+
+class RecordingTransport(Transport):
+    """
+    Transport recording all exchanges with the server into a gzipped
+    JSON lines cassette at `path`, for later offline use with
+    :class:`ReplayTransport`. Values of `SECRET_ELEMENTS` (password and
+    session ID) are replaced by `REDACTED` in recorded envelopes.
+
+    :param str path: Cassette file, overwritten
+    :param kwargs: Arguments of :class:`zeep.transports.Transport`
+    """
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._write({"version": CASSETTE_VERSION})
+
+    def _write(self, interaction):
+        with self._lock:
+            self._file.write(json.dumps(interaction, separators=(",", ":")))
+            self._file.write("\n")
+            self._file.flush()
+
+    def _load_remote_data(self, url):
+        start = time.perf_counter()
+        content = super()._load_remote_data(url)
+        self._write(
+            {
+                "kind": "load",
+                "url": url,
+                "status": 200,
+                "headers": {},
+                "content": content.decode("utf-8"),
+                "elapsed": time.perf_counter() - start,
+            }
+        )
+        return content
+
+    def post(self, address, message, headers):
+        start = time.perf_counter()
+        response = super().post(address, message, headers)
+        elapsed = time.perf_counter() - start
+        if isinstance(message, bytes):
+            message = message.decode("utf-8")
+        self._write(
+            {
+                "kind": "post",
+                "url": address,
+                "operation": _operation(message),
+                "request": _redact(message),
+                "status": response.status_code,
+                "headers": {
+                    "Content-Type": response.headers.get("Content-Type", "text/xml")
+                },
+                "content": _redact(
+                    response.content.decode(response.encoding or "utf-8")
+                ),
+                "elapsed": elapsed,
+            }
+        )
+        return response
+
+    def close(self):
+        """Finish writing the cassette"""
+        if getattr(self, "_file", None) is not None and not self._file.closed:
+            with self._lock:
+                self._file.close()
+
+    def __del__(self):
+        self.close()
+        super().__del__()
+
+
+class ReplayTransport(Transport):
+    """
+    Transport answering from a cassette recorded by
+    :class:`RecordingTransport`, without any network access.
+
+    SOAP calls are matched by operation name and answered with recorded
+    responses of that operation in their original order.
+
+    :param str path: Cassette file
+    :param float latency: Multiplier of recorded durations, 0 replays
+        without any delay
+    :param bool loop: Start over when responses for an operation run out,
+        instead of raising `LookupError`
+    :param kwargs: Arguments of :class:`zeep.transports.Transport`
+    """
+
+    def __init__(self, path, latency=1.0, loop=True, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.loop = loop
+        self._loads = {}
+        self._recorded = defaultdict(list)
+        for interaction in read_cassette(path):
+            if interaction["kind"] == "load":
+                self._loads[interaction["url"]] = interaction
+            else:
+                self._recorded[interaction["operation"]].append(interaction)
+        self._queues = {
+            operation: deque(interactions)
+            for operation, interactions in self._recorded.items()
+        }
+        self._lock = threading.Lock()
+
+    def _delay(self, interaction):
+        if self.latency:
+            time.sleep(interaction["elapsed"] * self.latency)
+
+    def _load_remote_data(self, url):
+        try:
+            interaction = self._loads[url]
+        except KeyError:
+            raise LookupError(f"No recorded content for {url}.")
+        self._delay(interaction)
+        return interaction["content"].encode("utf-8")
+
+    def post(self, address, message, headers):
+        operation = _operation(message)
+        with self._lock:
+            queue = self._queues.get(operation)
+            if not queue and self.loop and self._recorded.get(operation):
+                queue = self._queues[operation] = deque(self._recorded[operation])
+            if not queue:
+                raise LookupError(f"No recorded response for {operation}.")
+            interaction = queue.popleft()
+        self._delay(interaction)
+
+        response = Response()
+        response.url = address
+        response.status_code = interaction["status"]
+        response.headers = CaseInsensitiveDict(interaction["headers"])
+        response.encoding = "utf-8"
+        response._content = interaction["content"].encode("utf-8")
+        return response
@@ -0,0 +1,168 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import threading
+
+from subreg.batch import run_parallel
+from subreg.utils import get_value
+
+IDENTITY_FIELDS = ("name", "surname", "org", "email")
+
+
+def normalize(value):
+    """Normalize identity field value for comparison"""
+    if value is None:
+        return ""
+    return " ".join(str(value).split()).casefold()
+
+
+class ContactIndex:
+    """
+    Local index of account contacts keyed by ID and by normalized identity
+    fields, so registering many domains for the same registrant reuses
+    one contact instead of a lookup or create per order. The index is
+    loaded on first :meth:`get_or_create`, or explicitly by :meth:`load`.
+
+    :param Api api: Logged in API instance
+    :param tuple fields: Fields identifying the same person
+    """
+
+    def __init__(self, api, fields=IDENTITY_FIELDS):
+        self.api = api
+        self.fields = tuple(fields)
+        self._by_id = {}
+        self._by_identity = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def identity(self, contact):
+        """Return hashable identity key of `contact`"""
+        return tuple(normalize(get_value(contact, field)) for field in self.fields)
+
+    def load(self):
+        """(Re)load index with a single `Contacts_List` call"""
+        contacts = get_value(self.api.contacts_list(), "contacts", [])
+        with self._lock:
+            self._by_id.clear()
+            self._by_identity.clear()
+            for contact in contacts:
+                self._add(contact)
+            self._loaded = True
+        return len(self._by_id)
+
+    def _add(self, contact):
+        contact_id = str(get_value(contact, "id"))
+        self._by_id[contact_id] = contact
+        self._by_identity.setdefault(self.identity(contact), contact_id)
+
+    def _update(self, contact):
+        """Merge updated fields of `contact` into indexed contact"""
+        contact_id = str(contact["id"])
+        old = self._by_id.get(contact_id)
+        if old is not None:
+            key = self.identity(old)
+            # the identity may belong to another contact with same fields
+            if self._by_identity.get(key) == contact_id:
+                del self._by_identity[key]
+            # contacts from `Contacts_List` are zeep objects
+            contact = {**dict(getattr(old, "__values__", old)), **contact}
+        self._add(contact)
+
+    def get(self, contact_id):
+        """Return indexed contact by ID, or None"""
+        return self._by_id.get(str(contact_id))
+
+    def find(self, contact):
+        """Return ID of indexed contact with same identity, or None"""
+        return self._by_identity.get(self.identity(contact))
+
+    def get_or_create(self, contact):
+        """
+        Return ID of existing contact with same identity as `contact`,
+        create it when there is none. Safe to call from many threads,
+        concurrent calls for the same identity create one contact.
+
+        :param dict contact: Contact fields as for `Create_Contact`
+        """
+        if not self._loaded:
+            # without existing contacts every identity would be created again
+            with self._load_lock:
+                if not self._loaded:
+                    self.load()
+        key = self.identity(contact)
+        with self._lock:
+            contact_id = self._by_identity.get(key)
+            if contact_id is not None:
+                return contact_id
+            event = self._pending.get(key)
+            owner = event is None
+            if owner:
+                event = self._pending[key] = threading.Event()
+        if not owner:
+            event.wait()
+            contact_id = self._by_identity.get(key)
+            if contact_id is None:
+                # creating thread failed, try on our own
+                return self.get_or_create(contact)
+            return contact_id
+        try:
+            contact_id = str(self.api.create_contact(**contact))
+            with self._lock:
+                self._add(dict(contact, id=contact_id))
+            return contact_id
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+
+    def bulk_update(self, contacts, workers=8, rate=None, limiter=None):
+        """
+        Update many contacts concurrently.
+
+        :param list contacts: Contact dicts, each with `id`
+        :param int workers: Maximum number of concurrent calls
+        :param float rate: Maximum number of calls per second
+        :param AdaptiveLimiter limiter: Optional adaptive concurrency limit
+
+        :return dict
+            :key `updated`: list of updated contact IDs
+            :key `failed`: list of (contact, error) tuples
+        """
+        report = {"updated": [], "failed": []}
+        for result in run_parallel(
+            lambda contact: self.api.update_contact(**contact),
+            contacts,
+            workers=workers,
+            rate=rate,
+            limiter=limiter,
+        ):
+            if result.error is None:
+                report["updated"].append(result.item["id"])
+                with self._lock:
+                    self._update(result.item)
+            else:
+                report["failed"].append((result.item, result.error))
+        return report
@@ -0,0 +1,223 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from collections import namedtuple
+from decimal import Decimal
+
+from subreg.batch import run_parallel
+from subreg.exceptions import ApiError
+from subreg.journal import Journal
+from subreg.utils import get_value
+
+CreditOperation = namedtuple(
+    "CreditOperation", ["username", "amount", "reason", "currency", "key"]
+)
+CreditOperation.__new__.__defaults__ = (None, None, None)
+CreditOperation.__doc__ = """
+Credit change of one sub-user. With `currency` it is a `Client_Payment`
+(generates invoice), otherwise a `Credit_Correction` with `reason`.
+`key` identifies the operation across retries, derived from the other
+fields when omitted, so include the period in `reason` (e.g. "Top-up
+2026-10") to keep monthly runs apart.
+"""
+
+
+def _decimal(value):
+    return None if value is None else Decimal(str(value))
+
+
+class CreditBatch:
+    """
+    Apply credit operations to many sub-users and reconcile the outcome.
+
+    Operations run concurrently under a rate limit and every one is
+    journaled under its operation key, so re-running a batch after a crash
+    or partial failure never credits a sub-user twice: confirmed
+    operations are skipped, operations rejected by the server are retried
+    and operations with unknown outcome (crash after the intent, timeout)
+    are never sent again. Those are reported as `unconfirmed`; check them
+    against `Users_List` and record the outcome with :meth:`resolve`.
+
+    Sub-user credits (`Users_List`) and own credit (`Get_Credit`) are read
+    before and after the batch and compared with the applied amounts in
+    one report.
+
+    >>> with Journal("topup-2026-10.journal") as journal:
+    ...     batch = CreditBatch(api, journal, rate=5)
+    ...     report = batch.run([
+    ...         CreditOperation(user, 500, "Top-up 2026-10")
+    ...         for user in batch.usernames()
+    ...     ])
+
+    :param Api api: Logged in API instance
+    :param Journal journal: Journal of applied operations, or its path
+    :param int workers: Maximum number of concurrent operations
+    :param float rate: Maximum number of operations per second
+    :param AdaptiveLimiter limiter: Optional adaptive concurrency limit
+    """
+
+    def __init__(self, api, journal, workers=4, rate=2, limiter=None):
+        self.api = api
+        if not isinstance(journal, Journal):
+            journal = Journal(journal)
+        self.journal = journal
+        self.workers = workers
+        self.rate = rate
+        self.limiter = limiter
+
+    def credits(self):
+        """Return {username: credit} of all sub-users"""
+        users = get_value(self.api.users_list(), "users", [])
+        return {
+            get_value(user, "username"): _decimal(get_value(user, "credit"))
+            for user in users
+        }
+
+    def usernames(self):
+        """Return usernames of all sub-users"""
+        return list(self.credits())
+
+    def own_credit(self):
+        """Return own account credit"""
+        credit = get_value(self.api.get_credit(), "credit")
+        # either plain amount or structure with amount and currency
+        if isinstance(credit, (int, float, str, Decimal)):
+            return _decimal(credit)
+        return _decimal(get_value(credit, "amount"))
+
+    def key(self, operation):
+        """Return idempotency key of `operation`"""
+        if operation.key:
+            return operation.key
+        return Journal.key("credit", *operation[:4])
+
+    def resolve(self, operation, applied):
+        """Record outcome of an unconfirmed operation checked manually"""
+        self.journal.resolve(self.key(operation), applied)
+
+    def _apply(self, operation):
+        key = self.key(operation)
+        if self.journal.is_done(key):
+            return "skipped"
+        if self.journal.is_unconfirmed(key):
+            return "unconfirmed"
+        if operation.currency:
+            self.journal.call(
+                self.api.client_payment,
+                operation.username,
+                operation.amount,
+                operation.currency,
+                key=key,
+            )
+        else:
+            self.journal.call(
+                self.api.credit_correction,
+                operation.username,
+                operation.amount,
+                operation.reason,
+                key=key,
+            )
+        return "applied"
+
+    def run(self, operations):
+        """
+        Apply `operations` not yet confirmed in the journal.
+
+        :return dict report
+            :key `applied`: Operations applied by this run
+            :key `skipped`: Operations confirmed by an earlier run
+            :key `duplicates`: Operations dropped because an earlier
+                operation of the batch has the same key
+            :key `failed`: (operation, error) tuples of operations rejected
+                by the server, retried by the next run
+            :key `unconfirmed`: (operation, error) tuples of operations
+                which may have been applied, error is None for those left
+                unconfirmed by an earlier run; never sent again until
+                :meth:`resolve` is called
+            :key `amount`: Sum of amounts applied by this run
+            :key `credit`: Own credit `before` and `after` the run
+            :key `users`: {username: {`before`, `expected`, `after`}} of
+                sub-users with applied operations
+            :key `mismatched`: Usernames whose credit after the run differs
+                from expected
+        """
+        unique = {}
+        duplicates = []
+        for operation in operations:
+            key = self.key(operation)
+            if key in unique:
+                duplicates.append(operation)
+            else:
+                unique[key] = operation
+        operations = list(unique.values())
+        credit_before = self.own_credit()
+        before = self.credits()
+
+        results = run_parallel(
+            self._apply, operations, self.workers, self.rate, self.limiter
+        )
+
+        credit_after = self.own_credit()
+        after = self.credits()
+
+        report = {
+            "applied": 0,
+            "skipped": 0,
+            "duplicates": duplicates,
+            "failed": [],
+            "unconfirmed": [],
+            "amount": Decimal(0),
+            "credit": {"before": credit_before, "after": credit_after},
+            "users": {},
+            "mismatched": [],
+        }
+        for result in results:
+            operation = result.item
+            if isinstance(result.error, ApiError):
+                report["failed"].append((operation, result.error))
+                continue
+            if result.error is not None or result.result == "unconfirmed":
+                report["unconfirmed"].append((operation, result.error))
+                continue
+            if result.result == "skipped":
+                report["skipped"] += 1
+                continue
+            amount = _decimal(operation.amount)
+            report["applied"] += 1
+            report["amount"] += amount
+            user = report["users"].setdefault(
+                operation.username,
+                {
+                    "before": before.get(operation.username),
+                    "expected": before.get(operation.username),
+                    "after": after.get(operation.username),
+                },
+            )
+            if user["expected"] is not None:
+                user["expected"] += amount
+
+        for username, user in report["users"].items():
+            if user["expected"] != user["after"]:
+                report["mismatched"].append(username)
+        return report
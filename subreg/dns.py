@@ -0,0 +1,283 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import io
+import ipaddress
+import re
+
+from lxml import etree
+
+from subreg.exceptions import ApiError, RecordValidationError
+from subreg.utils import get_value
+
+MIN_TTL = 60
+MAX_TTL = 2147483647
+
+RECORD_TYPES = ("A", "AAAA", "CNAME", "MX", "NS", "PTR", "TXT", "SRV", "CAA")
+
+# types whose content is a hostname
+HOSTNAME_TYPES = ("CNAME", "MX", "NS", "PTR")
+
+# types requiring `prio`
+PRIO_TYPES = ("MX", "SRV")
+
+CAA_TAGS = ("issue", "issuewild", "iodef")
+
+_LABEL = r"(?:[A-Za-z0-9_](?:[A-Za-z0-9_-]{0,61}[A-Za-z0-9])?)"
+_HOSTNAME_RE = re.compile(rf"^{_LABEL}(?:\.{_LABEL})*$")
+_NAME_RE = re.compile(rf"^(?:\*|{_LABEL})(?:\.{_LABEL})*$")
+_SRV_RE = re.compile(r"^(\d+)\s+(\d+)\s+(\S+)$")
+_CAA_RE = re.compile(r'^(\d+)\s+([A-Za-z0-9]+)\s+"([^"]*)"$')
+
+
+def _hostname(value):
+    value = value[:-1] if value.endswith(".") else value
+    return len(value) <= 253 and bool(_HOSTNAME_RE.match(value))
+
+
+def _port(value):
+    return 0 <= int(value) <= 65535
+
+
+def relative_name(name, domain=None):
+    """
+    Return normalized record name relative to `domain`: lower-case,
+    without trailing dot, empty for the zone apex (``@`` or `domain`
+    itself)
+    """
+    name = str(name or "").strip().lower().rstrip(".")
+    if name == "@":
+        return ""
+    if domain:
+        domain = domain.strip().lower().rstrip(".")
+        if name == domain:
+            return ""
+        if name.endswith("." + domain):
+            return name[: -len(domain) - 1]
+    return name
+
+
+def normalize_record(record):
+    """
+    Return normalized copy of `record`: upper-case type, lower-case name
+    without surrounding whitespace and hostname content without
+    trailing dot.
+    """
+    record = dict(record)
+    record["type"] = str(get_value(record, "type", "")).strip().upper()
+    name = str(get_value(record, "name", "")).strip().lower()
+    record["name"] = "" if name == "@" else name.rstrip(".")
+    content = str(get_value(record, "content", "")).strip()
+    if record["type"] in HOSTNAME_TYPES:
+        content = content.rstrip(".").lower()
+    elif record["type"] == "SRV":
+        parts = content.split()
+        if parts and parts[-1] != ".":
+            parts[-1] = parts[-1].rstrip(".").lower()
+        content = " ".join(parts)
+    record["content"] = content
+    return record
+
+
+def record_errors(record, min_ttl=MIN_TTL, max_ttl=MAX_TTL):
+    """
+    Check syntax of normalized `record`.
+
+    :return list of error messages, empty for valid record
+    """
+    errors = []
+    _type = record.get("type")
+    name = record.get("name", "")
+    content = record.get("content", "")
+
+    if _type not in RECORD_TYPES:
+        return [f"Unsupported record type {_type!r}."]
+    if name and (len(name) > 253 or not _NAME_RE.match(name)):
+        errors.append(f"Invalid record name {name!r}.")
+
+    if not content:
+        errors.append("Record content is required.")
+    elif _type == "A":
+        try:
+            ipaddress.IPv4Address(content)
+        except ValueError:
+            errors.append(f"Invalid IPv4 address {content!r}.")
+    elif _type == "AAAA":
+        try:
+            ipaddress.IPv6Address(content)
+        except ValueError:
+            errors.append(f"Invalid IPv6 address {content!r}.")
+    elif _type in HOSTNAME_TYPES:
+        if not _hostname(content):
+            errors.append(f"Invalid hostname {content!r}.")
+    elif _type == "SRV":
+        match = _SRV_RE.match(content)
+        if not match or not _port(match.group(1)) or not _port(match.group(2)):
+            errors.append(f"SRV content must be 'weight port target', not {content!r}.")
+        elif match.group(3) != "." and not _hostname(match.group(3)):
+            errors.append(f"Invalid SRV target {match.group(3)!r}.")
+    elif _type == "CAA":
+        match = _CAA_RE.match(content)
+        if not match or int(match.group(1)) > 255:
+            errors.append(
+                f"CAA content must be 'flags tag \"value\"', not {content!r}."
+            )
+        elif match.group(2).lower() not in CAA_TAGS:
+            errors.append(f"Unknown CAA tag {match.group(2)!r}.")
+    elif _type == "TXT":
+        if any(ord(char) < 32 or ord(char) == 127 for char in content):
+            errors.append("TXT content contains control characters.")
+
+    prio = record.get("prio")
+    if _type in PRIO_TYPES:
+        if prio in (None, ""):
+            errors.append(f"{_type} record requires prio.")
+        elif not str(prio).isdigit() or not _port(prio):
+            errors.append(f"Invalid prio {prio!r}.")
+
+    ttl = record.get("ttl")
+    if ttl not in (None, ""):
+        if not str(ttl).isdigit() or not min_ttl <= int(ttl) <= max_ttl:
+            errors.append(f"TTL must be between {min_ttl} and {max_ttl}, not {ttl!r}.")
+    return errors
+
+
+def validate_record(record, min_ttl=MIN_TTL, max_ttl=MAX_TTL):
+    """
+    Normalize and validate a single record.
+
+    :return dict normalized record
+
+    .. exception:: RecordValidationError
+    """
+    record = normalize_record(record)
+    errors = record_errors(record, min_ttl, max_ttl)
+    if errors:
+        raise RecordValidationError(record, errors)
+    return record
+
+
+def validate_records(records, zone=None, domain=None, min_ttl=MIN_TTL, max_ttl=MAX_TTL):
+    """
+    Normalize and validate many records at once, including CNAME conflicts
+    between the records themselves and against current `zone`.
+
+    :param list records: Records to add
+    :param list zone: Current records of the zone, as returned by
+        :meth:`subreg.Api.get_dns_zone`
+    :param str domain: Zone domain, fully qualified names of `records` and
+        `zone` are compared relative to it
+
+    :return tuple (list of valid normalized records,
+        list of :class:`RecordValidationError`)
+    """
+    # name -> set of record types, for CNAME conflict detection
+    types = {}
+    for record in zone or []:
+        name = relative_name(get_value(record, "name", ""), domain)
+        _type = str(get_value(record, "type", "")).upper()
+        types.setdefault(name, set()).add(_type)
+
+    valid, invalid = [], []
+    for record in records:
+        record = normalize_record(record)
+        record["name"] = relative_name(record["name"], domain)
+        errors = record_errors(record, min_ttl, max_ttl)
+        existing = types.setdefault(record["name"], set())
+        if record["type"] == "CNAME" and existing:
+            errors.append(
+                f"CNAME conflicts with existing records at {record['name']!r}."
+            )
+        elif record["type"] != "CNAME" and "CNAME" in existing:
+            errors.append(f"Name {record['name']!r} already has a CNAME record.")
+        if errors:
+            invalid.append(RecordValidationError(record, errors))
+        else:
+            existing.add(record["type"])
+            valid.append(record)
+    return valid, invalid
+
+
+def _localname(element):
+    return element.tag.rpartition("}")[2]
+
+
+def _record(element):
+    record = {}
+    for child in element:
+        if isinstance(child.tag, str):
+            name, value = _localname(child), child.text
+            if name in ("id", "prio", "ttl") and value and value.isdigit():
+                value = int(value)
+            record[name] = value
+    return record
+
+
+def iter_zone_records(content, types=None, names=None):
+    """
+    Parse raw `Get_DNS_Zone` response incrementally, yielding only records
+    matching `types` and `names`. Other records are discarded as soon as
+    they are parsed, so memory grows only with matching records.
+
+    :param bytes content: Raw SOAP response
+    :param list types: Record types to select, all when omitted
+    :param list names: Record names to select, all when omitted
+
+    .. exception:: ApiError
+    """
+    types = {_type.upper() for _type in types} if types else None
+    names = {name.lower().rstrip(".") for name in names} if names else None
+    status, error = None, {}
+    for _, element in etree.iterparse(
+        io.BytesIO(content), events=("end",), huge_tree=True
+    ):
+        if not isinstance(element.tag, str):
+            continue
+        tag = _localname(element)
+        if tag == "status" and not len(element):
+            status = element.text
+        elif tag in ("errormsg", "major", "minor") and not len(element):
+            error[tag] = element.text
+        elif len(element) > 1:
+            children = {
+                _localname(child) for child in element if isinstance(child.tag, str)
+            }
+            if "type" not in children or "content" not in children:
+                continue
+            record = _record(element)
+            # record elements are dropped, keeping the parsed tree small
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+            if types is not None and str(record.get("type", "")).upper() not in types:
+                continue
+            if names is not None and str(record.get("name") or "").lower() not in names:
+                continue
+            yield record
+    if status == "error":
+        raise ApiError(
+            message=error.get("errormsg"),
+            major=error.get("major", 0),
+            minor=error.get("minor", 0),
+        )
@@ -0,0 +1,86 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import base64
+import binascii
+
+# multiple of both 3 (raw) and 4 (base64) bytes, so chunks never need padding
+CHUNK_SIZE = 3 * 4 * 16384
+
+
+def encode_document(fileobj, chunk_size=CHUNK_SIZE):
+    """
+    Base64 encode content of binary `fileobj` chunk by chunk,
+    never holding the whole raw file in memory.
+
+    :param fileobj: File object opened in binary mode
+    :param int chunk_size: Bytes read at once, rounded down to multiple of 3
+
+    :return str base64 encoded document
+    """
+    chunk_size = max(3, chunk_size - chunk_size % 3)
+    chunks = []
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        # short reads are carried over to keep every chunk padding free
+        while len(chunk) % 3:
+            more = fileobj.read(3 - len(chunk) % 3)
+            if not more:
+                break
+            chunk += more
+        chunks.append(base64.b64encode(chunk).decode("ascii"))
+    return "".join(chunks)
+
+
+def decode_document(document, fileobj, chunk_size=CHUNK_SIZE):
+    """
+    Decode base64 `document` into binary `fileobj` chunk by chunk,
+    never holding the whole decoded file in memory.
+
+    :param str document: base64 encoded document
+    :param fileobj: File object opened in binary mode
+    :param int chunk_size: Characters decoded at once, rounded down
+        to multiple of 4
+
+    :return int number of bytes written
+    """
+    if isinstance(document, bytes):
+        document = document.decode("ascii")
+    # whitespace (line breaks, spaces) is allowed in base64 payloads but
+    # breaks chunk alignment
+    document = "".join(document.split())
+    chunk_size = max(4, chunk_size - chunk_size % 4)
+    written = 0
+    for start in range(0, len(document), chunk_size):
+        try:
+            chunk = base64.b64decode(
+                document[start : start + chunk_size], validate=True
+            )
+        except binascii.Error as e:
+            raise ValueError(f"Invalid base64 document: {e}") from e
+        fileobj.write(chunk)
+        written += len(chunk)
+    return written
@@ -0,0 +1,217 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from subreg.batch import submit_in_context
+
+Attempt = namedtuple(
+    "Attempt",
+    ["index", "scheduled", "started", "latency", "available", "order_id", "error"],
+)
+Attempt.__doc__ = """
+Single timed attempt of :class:`DropCatcher`. `scheduled` and `started`
+are epoch seconds, `latency` is duration of the attempt in seconds,
+`available` result of the availability check (None when not checked or
+failed) and `order_id` the placed order, if this attempt placed it.
+"""
+
+# sleep until this many seconds before the deadline, then spin
+SPIN = 0.002
+
+
+def _epoch(moment):
+    if isinstance(moment, datetime):
+        return moment.timestamp()
+    return float(moment)
+
+
+def wait_until(moment):
+    """
+    Block until epoch time `moment` with sub-millisecond precision: sleep
+    most of the time, busy-wait the last few milliseconds
+    """
+    # perf_counter is monotonic and precise, anchor it to wall clock once
+    deadline = time.perf_counter() + (moment - time.time())
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        if remaining > SPIN:
+            time.sleep(remaining - SPIN)
+
+
+class DropCatcher:
+    """
+    Catch a domain at the moment the registry releases it.
+
+    Everything avoidable is done ahead of `release_at` by :meth:`prepare`:
+    the API is logged in, pooled connections are opened by concurrent
+    warm-up checks and `Check_Domain` / `Make_Order` envelopes are built
+    and serialized. :meth:`run` then fires `attempts` attempts every
+    `spacing` seconds starting `lead` seconds before the release, up to
+    `parallel` in flight. The first attempt seeing the domain available
+    places the order, exactly once; remaining attempts are skipped.
+
+    With `check=False` attempts place the order directly, useful when the
+    registry rejects early orders cheaply anyway.
+
+    >>> catcher = DropCatcher(api, "example.cz", release_at, params=params)
+    >>> catcher.prepare()
+    >>> order_id = catcher.run()
+    >>> catcher.attempts
+
+    :param Api api: Logged in API instance
+    :param str domain: Domain to catch
+    :param release_at: Expected release, epoch seconds or `datetime`
+    :param str order_type: `Create_Domain`, `Backorder_Domain` or
+        `Preregister_Domain`
+    :param dict params: Order parameters
+    :param int attempts: Number of timed attempts
+    :param float spacing: Seconds between attempts
+    :param int parallel: Maximum number of attempts in flight
+    :param float lead: Seconds before `release_at` to fire the first attempt
+    :param bool check: Check availability before ordering
+    """
+
+    def __init__(
+        self,
+        api,
+        domain,
+        release_at,
+        order_type="Create_Domain",
+        params=None,
+        attempts=20,
+        spacing=0.05,
+        parallel=4,
+        lead=0.0,
+        check=True,
+    ):
+        self.api = api
+        self.domain = domain
+        self.release_at = _epoch(release_at)
+        self.order_type = order_type
+        self.params = params
+        self.count = attempts
+        self.spacing = spacing
+        self.parallel = parallel
+        self.lead = lead
+        self.check = check
+        self.attempts = []
+        self.order_id = None
+        self._check = None
+        self._order = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def schedule(self):
+        """Return epoch times of the attempts"""
+        start = self.release_at - self.lead
+        return [start + i * self.spacing for i in range(self.count)]
+
+    def prepare(self, warmup=None):
+        """
+        Build requests and open `warmup` (default `parallel`) pooled
+        connections by concurrent `Check_Domain` calls. Call shortly before
+        the release, so the session and connections do not expire.
+        """
+        if not self.api.ssid:
+            raise Exception("Login before preparing drop-catch.")
+        self._check = self.api._prepare("Check_Domain", {"domain": self.domain})
+        order = {"domain": self.domain, "type": self.order_type}
+        if self.params:
+            order["params"] = self.params
+        self._order = self.api._prepare("Make_Order", {"order": order})
+
+        warmup = self.parallel if warmup is None else warmup
+        with ThreadPoolExecutor(max_workers=max(warmup, 1)) as pool:
+            # errors are fine here, the connection is open either way
+            futures = [
+                submit_in_context(pool, self._call, self._check) for _ in range(warmup)
+            ]
+            for future in futures:
+                future.result()
+
+    @staticmethod
+    def _call(request):
+        try:
+            return request(), None
+        except Exception as error:
+            return None, error
+
+    def _attempt(self, index, scheduled):
+        if self._done.is_set():
+            return None
+        started = time.time()
+        begin = time.perf_counter()
+        available, order_id, error = None, None, None
+
+        if self.check:
+            data, error = self._call(self._check)
+            if error is None:
+                available = data["avail"] == 1
+
+        if error is None and (available or not self.check):
+            with self._lock:
+                # another attempt may have ordered while we were checking
+                if not self._done.is_set():
+                    data, error = self._call(self._order)
+                    if error is None:
+                        order_id = self.order_id = data["orderid"]
+                        self._done.set()
+
+        latency = time.perf_counter() - begin
+        return Attempt(index, scheduled, started, latency, available, order_id, error)
+
+    def run(self):
+        """
+        Fire the attempts on schedule, return placed order ID or None.
+        Per attempt results are in :attr:`attempts`, attempts skipped after
+        the order was placed are left out.
+        """
+        if self._check is None:
+            self.prepare()
+        self.attempts = []
+        self._done.clear()
+
+        with ThreadPoolExecutor(max_workers=self.parallel) as pool:
+            # start all worker threads now, not at the first attempts
+            barrier = threading.Barrier(self.parallel)
+            list(pool.map(lambda _: barrier.wait(), range(self.parallel)))
+            futures = []
+            for index, scheduled in enumerate(self.schedule()):
+                wait_until(scheduled)
+                if self._done.is_set():
+                    break
+                futures.append(submit_in_context(pool, self._attempt, index, scheduled))
+
+        for future in futures:
+            attempt = future.result()
+            if attempt is not None:
+                self.attempts.append(attempt)
+        return self.order_id
@@ -36,3 +36,14 @@ class ApiError(Exception):
             self.minor,
             self.message,
         )
+
+
+class RecordValidationError(ValueError):
+    """DNS record rejected by local validation."""
+
+    def __init__(self, record, errors):
+        self.record = record
+        self.errors = list(errors)
+
+    def __str__(self):
+        return "Record: {} Errors: {}".format(self.record, " ".join(self.errors))
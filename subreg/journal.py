@@ -0,0 +1,241 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from subreg.batch import run_parallel
+from subreg.exceptions import ApiError
+
+
+class Journal:
+    """
+    Append-only write-ahead journal of mutating API calls.
+
+    Every call is written as `intent` before it is sent and as `done` or
+    `failed` once it returns, so a restarted bulk job skips operations
+    already confirmed and only repeats the remaining ones.
+
+    Calls returning False (e.g. :meth:`subreg.Api.set_autorenew` or
+    :meth:`subreg.Api.delete_dns_record` on :class:`subreg.ApiError`) are
+    recorded as failed.
+
+    A failure is `rejected` when the server answered with an error, so the
+    operation was certainly not applied. Other failures (timeouts,
+    connection errors) and intents without outcome may have been applied,
+    see :meth:`is_unconfirmed`.
+
+    :param str path: Journal file, created when missing
+    :param bool fsync: Flush every entry to disk before continuing
+    """
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._done = {}
+        self._pending = {}
+        self._failed = {}
+        # keys of calls in progress in this process
+        self._running = set()
+        if os.path.exists(path):
+            self._replay()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _replay(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # torn last line after a crash
+                    continue
+                self._record(entry)
+
+    def _record(self, entry):
+        key = entry["key"]
+        if entry["state"] == "intent":
+            self._pending[key] = entry
+            return
+        self._pending.pop(key, None)
+        if entry["state"] == "done":
+            self._failed.pop(key, None)
+            self._done[key] = entry.get("result")
+        else:
+            self._failed[key] = entry
+
+    def _append(self, entry):
+        # caller holds self._lock
+        entry["time"] = time.time()
+        line = json.dumps(entry, default=str, separators=(",", ":"))
+        self._file.write(line + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _write(self, entry):
+        with self._lock:
+            self._append(entry)
+
+    def _finish(self, entry):
+        with self._lock:
+            self._append(dict(entry))
+            self._record(entry)
+            self._running.discard(entry["key"])
+
+    @staticmethod
+    def key(command, *args, **kwargs):
+        """Return operation key of `command` called with arguments"""
+        payload = json.dumps(
+            [command, args, kwargs], default=str, sort_keys=True, separators=(",", ":")
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def is_done(self, key):
+        """Return True when operation `key` is confirmed"""
+        return key in self._done
+
+    def pending(self):
+        """
+        Return intents without recorded outcome, i.e. operations which may
+        or may not have been applied before a crash.
+        """
+        return list(self._pending.values())
+
+    def is_unconfirmed(self, key):
+        """
+        Return True when operation `key` may or may not have been applied:
+        its intent has no outcome, or it failed without the server
+        rejecting it.
+        """
+        if key in self._pending:
+            return True
+        failed = self._failed.get(key)
+        return failed is not None and not failed.get("rejected")
+
+    def resolve(self, key, applied, result=None):
+        """
+        Record outcome of unconfirmed operation `key` after checking it by
+        other means.
+
+        :param bool applied: The operation was applied
+        """
+        if applied:
+            entry = {"key": key, "state": "done", "result": result}
+        else:
+            entry = {"key": key, "state": "failed", "rejected": True}
+        with self._lock:
+            self._append(dict(entry))
+            self._record(entry)
+
+    def call(self, func, *args, key=None, **kwargs):
+        """
+        Call `func(*args, **kwargs)` unless already confirmed in journal.
+
+        The check and the intent are written atomically, a call of an
+        operation already in progress in another thread raises
+        :class:`Exception` instead of sending it twice.
+
+        :param callable func: API method, e.g. `api.add_dns_record`
+        :param str key: Operation key, derived from method name and
+            arguments when omitted
+
+        :return result of `func`, or recorded result for confirmed operation
+        """
+        name = getattr(func, "__name__", repr(func))
+        if key is None:
+            key = self.key(name, *args, **kwargs)
+
+        entry = {
+            "key": key,
+            "state": "intent",
+            "op": name,
+            "args": args,
+            "kwargs": kwargs,
+        }
+        with self._lock:
+            if key in self._done:
+                return self._done[key]
+            if key in self._running:
+                raise Exception(f"Operation {key} is already in progress.")
+            self._running.add(key)
+            self._append(dict(entry))
+            self._record(entry)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self._finish(
+                {
+                    "key": key,
+                    "state": "failed",
+                    "error": str(e),
+                    "rejected": isinstance(e, ApiError),
+                }
+            )
+            raise
+        except BaseException:
+            with self._lock:
+                self._running.discard(key)
+            raise
+        if result is False:
+            self._finish({"key": key, "state": "failed", "rejected": True})
+        else:
+            self._finish({"key": key, "state": "done", "result": result})
+        return result
+
+    def run(self, api, operations, workers=1, rate=None, limiter=None):
+        """
+        Run many journaled operations, skipping confirmed ones without any
+        round trip.
+
+        :param Api api: Logged in API instance
+        :param list operations: (method name, args tuple) tuples, e.g.
+            ``("add_dns_record", ("example.com", record))``
+        :param int workers: Maximum number of concurrent calls
+        :param float rate: Maximum number of calls per second
+        :param AdaptiveLimiter limiter: Optional adaptive concurrency limit
+
+        :return list of :class:`subreg.batch.BatchResult`
+        """
+
+        def run_operation(operation):
+            name, args = operation
+            return self.call(getattr(api, name), *args)
+
+        return run_parallel(
+            run_operation, operations, workers=workers, rate=rate, limiter=limiter
+        )
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
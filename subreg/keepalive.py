@@ -0,0 +1,204 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from subreg.batch import submit_in_context
+from subreg.exceptions import ApiError
+
+
+class KeepAlive:
+    """
+    Keep an :class:`subreg.Api` instance warm between calls.
+
+    :meth:`start` opens `connections` pooled connections up front by
+    concurrent heartbeat calls, then a daemon thread issues a cheap
+    heartbeat (`Get_Credit`) whenever the instance was idle for `interval`
+    seconds. That keeps the TLS connections below the server keep-alive
+    timeout and the session alive. A heartbeat rejected with one of
+    `session_errors` logs in again with the stored credentials, other
+    errors only count as failed heartbeats. The expired session codes are
+    not guessed: pass those of the Subreg error list to enable relogin.
+
+    Latency of every HTTP response is observed through a session hook, so
+    :meth:`metrics` shows whether calls after idle periods are still
+    slower than warm ones.
+
+    >>> keepalive = KeepAlive(api, interval=30, session_errors=[(major, minor)])
+    >>> keepalive.start()
+    >>> keepalive.metrics()
+    >>> keepalive.stop()
+
+    :param Api api: Logged in API instance
+    :param float interval: Idle seconds before a heartbeat, keep it below
+        the server keep-alive timeout
+    :param int connections: Connections opened by :meth:`warm`, defaults
+        to the API pool size
+    :param float idle: Idle seconds after which a call counts as cold
+    :param session_errors: (major, minor) codes of :class:`subreg.ApiError`
+        meaning the session expired, no relogin when empty
+    """
+
+    def __init__(
+        self,
+        api,
+        interval=30,
+        connections=None,
+        idle=None,
+        session_errors=(),
+    ):
+        self.api = api
+        self.interval = interval
+        self.connections = connections or api.pool_size or 1
+        self.idle = interval if idle is None else idle
+        self.session_errors = set(session_errors)
+        self.heartbeats = 0
+        self.failures = 0
+        self.relogins = 0
+        self._last = time.monotonic()
+        self._first = None
+        # [count, latency sum, latency max]
+        self._warm = [0, 0.0, 0.0]
+        self._cold = [0, 0.0, 0.0]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread = None
+        self._session = api.client.transport.session
+        self._session.hooks["response"].append(self._observe)
+
+    def _observe(self, response, *args, **kwargs):
+        now = time.monotonic()
+        latency = response.elapsed.total_seconds()
+        with self._lock:
+            # idle gap measured from the end of the previous call
+            gap = now - latency - self._last
+            self._last = now
+            if getattr(self._local, "heartbeat", False):
+                return
+            if self._first is None:
+                self._first = latency
+            stats = self._cold if gap >= self.idle else self._warm
+            stats[0] += 1
+            stats[1] += latency
+            stats[2] = max(stats[2], latency)
+
+    def beat(self):
+        """Send one heartbeat, log in again when the session is rejected"""
+        self._local.heartbeat = True
+        try:
+            self.api.get_credit()
+        except ApiError as error:
+            expired = (error.major, error.minor) in self.session_errors
+            if not expired or self.api._credentials is None:
+                raise
+            self.relogins += 1
+            self.api.relogin()
+        finally:
+            self._local.heartbeat = False
+        self.heartbeats += 1
+
+    def _safe_beat(self):
+        try:
+            self.beat()
+        except Exception:
+            self.failures += 1
+
+    def warm(self):
+        """Open pooled connections with concurrent heartbeats"""
+        with ThreadPoolExecutor(max_workers=self.connections) as pool:
+            for _ in range(self.connections):
+                submit_in_context(pool, self._safe_beat)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                due = self._last + self.interval - time.monotonic()
+            if due > 0:
+                if self._stop.wait(due):
+                    return
+                continue
+            self._safe_beat()
+
+    def start(self, warm=True):
+        """Warm connections and start heartbeat thread, return self"""
+        if warm:
+            self.warm()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="subreg-keepalive", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop heartbeat thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """Stop and detach from the API session"""
+        self.stop()
+        if self._observe in self._session.hooks["response"]:
+            self._session.hooks["response"].remove(self._observe)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def metrics(self):
+        """
+        :return dict
+            :key `first`: Latency of the first observed call
+            :key `calls`: Number of observed calls, heartbeats excluded
+            :key `cold`: Number of calls after at least `idle` seconds idle
+            :key `cold_avg`: Average latency of cold calls
+            :key `cold_max`: Maximum latency of cold calls
+            :key `warm_avg`: Average latency of other calls
+            :key `heartbeats`: Successful heartbeats
+            :key `failures`: Failed heartbeats
+            :key `relogins`: Logins after a rejected heartbeat
+        """
+        with self._lock:
+            cold = list(self._cold)
+            warm = list(self._warm)
+            first = self._first
+        return {
+            "first": first,
+            "calls": cold[0] + warm[0],
+            "cold": cold[0],
+            "cold_avg": cold[1] / cold[0] if cold[0] else None,
+            "cold_max": cold[2] if cold[0] else None,
+            "warm_avg": warm[1] / warm[0] if warm[0] else None,
+            "heartbeats": self.heartbeats,
+            "failures": self.failures,
+            "relogins": self.relogins,
+        }
@@ -0,0 +1,235 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import time
+from collections import namedtuple
+
+from subreg.batch import RateLimiter, _caller, run_graph
+from subreg.utils import get_value
+
+# `Info_Order` statuses of finished orders
+ORDER_COMPLETED = ("completed",)
+ORDER_FAILED = ("error", "failed", "cancelled", "canceled")
+
+MigrationStep = namedtuple("MigrationStep", ["action", "target", "args"])
+MigrationStep.__doc__ = """
+Single order of a migration: `action` is the :class:`subreg.Api` method
+called with `target` and `args`.
+"""
+
+
+def wait_for_order(api, order_id, timeout=3600, interval=10, rate=None):
+    """
+    Poll `Info_Order` until order `order_id` is finished.
+
+    :param Api api: Logged in API instance
+    :param float timeout: Seconds to wait at most
+    :param float interval: Seconds between polls
+    :param RateLimiter rate: Optional limit shared with other calls
+
+    :return dict order info of completed order
+
+    .. exception:: Exception when the order failed
+    .. exception:: TimeoutError when the order did not finish in time
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if rate is not None:
+            rate.acquire()
+        response = api.info_order(order_id)
+        order = get_value(response, "order", response)
+        status = str(get_value(order, "status", "")).lower()
+        if status in ORDER_COMPLETED:
+            return order
+        if status in ORDER_FAILED:
+            raise Exception(
+                f"Order {order_id} {status}: {get_value(order, 'errormsg', '')}"
+            )
+        if time.monotonic() + interval > deadline:
+            raise TimeoutError(f"Order {order_id} not finished, status {status!r}.")
+        time.sleep(interval)
+
+
+def _hostname(host):
+    return host.strip().rstrip(".").lower()
+
+
+class NSMigration:
+    """
+    Nameserver migration over many domains and glue hosts, executed in
+    dependency order:
+
+    - domains switch NS only after new hosts they use are created or updated,
+    - old hosts are deleted only after every domain using them switched.
+
+    Independent steps run in parallel, see :func:`subreg.batch.run_graph`.
+    `Make_Order` only queues an order, so with `wait` a step counts as done
+    when :func:`wait_for_order` sees its order completed, and dependent
+    steps are released only then (`Delete_Host` fails while the host is
+    still in use). Waiting steps occupy a worker each.
+
+    `rate` applies to orders and `Info_Order` polls, `limiter` limits and
+    times only the orders, so long waits never count as slow calls.
+
+    >>> migration = NSMigration(api)
+    >>> migration.create_host("ns1.example.net", ipv4=["192.0.2.1"])
+    >>> migration.switch_ns("example.com", ["ns1.example.net"],
+    ...                     old_hosts=["ns1.example.org"])
+    >>> migration.delete_host("ns1.example.org")
+    >>> report = migration.run()
+
+    :param Api api: Logged in API instance
+    :param int workers: Maximum number of concurrent orders
+    :param float rate: Maximum number of orders per second
+    :param AdaptiveLimiter limiter: Optional adaptive concurrency limit
+    :param bool wait: Wait for orders to finish before releasing dependents
+    :param float timeout: Seconds to wait for a single order
+    :param float interval: Seconds between `Info_Order` polls
+    """
+
+    def __init__(
+        self,
+        api,
+        workers=8,
+        rate=None,
+        limiter=None,
+        wait=True,
+        timeout=3600,
+        interval=10,
+    ):
+        self.api = api
+        self.workers = workers
+        self.rate = rate
+        self.limiter = limiter
+        self.wait = wait
+        self.timeout = timeout
+        self.interval = interval
+        self._hosts = {}
+        self._switches = {}
+        self._deletes = {}
+
+    def _host_step(self, action, host, ipv4, ipv6):
+        host = _hostname(host)
+        if host in self._hosts or host in self._deletes:
+            raise ValueError(f"Host {host!r} is already planned.")
+        self._hosts[host] = MigrationStep(
+            action, host, (tuple(ipv4 or ()), tuple(ipv6 or ()))
+        )
+
+    def create_host(self, host, ipv4=None, ipv6=None):
+        """Plan creation of glue host"""
+        self._host_step("create_host", host, ipv4, ipv6)
+
+    def update_host(self, host, ipv4=None, ipv6=None):
+        """Plan change of glue host addresses"""
+        self._host_step("update_host", host, ipv4, ipv6)
+
+    def switch_ns(self, domain, hosts, old_hosts=None):
+        """
+        Plan NS change of `domain`.
+
+        :param str domain: Registered domain
+        :param list hosts: New nameserver hostnames
+        :param list old_hosts: Nameservers used until now; when omitted,
+            every planned host deletion waits for this domain
+        """
+        domain = domain.strip().lower()
+        if domain in self._switches:
+            raise ValueError(f"Domain {domain!r} is already planned.")
+        step = MigrationStep(
+            "modify_ns_domain", domain, (tuple(_hostname(host) for host in hosts),)
+        )
+        old = None if old_hosts is None else {_hostname(h) for h in old_hosts}
+        self._switches[domain] = (step, old)
+
+    def delete_host(self, host):
+        """Plan deletion of glue host once no planned domain uses it"""
+        host = _hostname(host)
+        if host in self._hosts or host in self._deletes:
+            raise ValueError(f"Host {host!r} is already planned.")
+        self._deletes[host] = MigrationStep("delete_host", host, ())
+
+    def dependencies(self):
+        """
+        Return dependency graph of planned steps.
+
+        :return dict :class:`MigrationStep` -> set of steps it waits for
+        """
+        graph = {step: set() for step in self._hosts.values()}
+        for step, old in self._switches.values():
+            hosts = step.args[0]
+            for host in hosts:
+                if host in self._deletes:
+                    raise ValueError(
+                        f"Host {host!r} is deleted but used by {step.target!r}."
+                    )
+            graph[step] = {self._hosts[host] for host in hosts if host in self._hosts}
+        for host, step in self._deletes.items():
+            graph[step] = {
+                switch
+                for switch, old in self._switches.values()
+                if old is None or host in old
+            }
+        return graph
+
+    def run(self):
+        """
+        Execute planned steps.
+
+        :return dict
+            :key `done`: list of (:class:`MigrationStep`, order ID) tuples
+            :key `failed`: list of (:class:`MigrationStep`, error) tuples
+            :key `skipped`: list of steps not run because a step they
+                depend on failed
+        """
+
+        rate = self.rate
+        if rate is not None and not isinstance(rate, RateLimiter):
+            rate = RateLimiter(rate)
+        # only the order itself is rate limited and timed by the limiter
+        order = _caller(
+            lambda step: getattr(self.api, step.action)(step.target, *step.args),
+            rate,
+            self.limiter,
+        )
+
+        def execute(step):
+            result = order(step)
+            if result.error is not None:
+                raise result.error
+            if self.wait:
+                wait_for_order(
+                    self.api, result.result, self.timeout, self.interval, rate
+                )
+            return result.result
+
+        workers = self.workers if self.limiter is None else self.limiter.maximum
+        results, skipped = run_graph(execute, self.dependencies(), workers=workers)
+        report = {"done": [], "failed": [], "skipped": skipped}
+        for result in results:
+            if result.error is None:
+                report["done"].append((result.item, result.result))
+            else:
+                report["failed"].append((result.item, result.error))
+        return report
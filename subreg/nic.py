@@ -0,0 +1,171 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import threading
+import time
+
+from subreg.batch import run_parallel
+
+NIC_OBJECTS = ("contact", "nsset", "keyset")
+
+
+def _key(handle, _object):
+    if _object not in NIC_OBJECTS:
+        raise ValueError(f"Unknown NIC object type {_object!r}.")
+    # registry handles are case insensitive
+    return handle.strip().upper(), _object
+
+
+class ObjectChecker:
+    """
+    Batched existence checks of CZ/EE registry objects (contact, nsset and
+    keyset handles) with a local TTL cache.
+
+    Handles of a batch are deduplicated, only those not cached are checked
+    with concurrent `Check_Object` calls, so validating handles of a bulk
+    registration costs one round trip per distinct unknown handle.
+    Concurrent checks of the same handle share one call. Failed checks are
+    not cached.
+
+    >>> checker = ObjectChecker(api, ttl=3600)
+    >>> found, missing, failed = checker.validate(
+    ...     [("CID-OWNER", "contact"), ("NSS-EXAMPLE", "nsset")]
+    ... )
+
+    :param Api api: Logged in API instance
+    :param float ttl: Seconds a check result is cached
+    :param int workers: Maximum number of concurrent checks
+    :param float rate: Maximum number of checks per second
+    :param AdaptiveLimiter limiter: Optional adaptive concurrency limit
+    """
+
+    def __init__(self, api, ttl=3600, workers=8, rate=None, limiter=None):
+        self.api = api
+        self.ttl = ttl
+        self.workers = workers
+        self.rate = rate
+        self.limiter = limiter
+        self._cache = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def cached(self, handle, _object):
+        """Return cached existence of the object, or None when unknown"""
+        key = _key(handle, _object)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            exists, expires = entry
+            if expires < time.monotonic():
+                del self._cache[key]
+                return None
+            return exists
+
+    def remember(self, handle, _object, exists=True):
+        """Cache existence of an object, e.g. one just created"""
+        key = _key(handle, _object)
+        with self._lock:
+            self._cache[key] = (exists, time.monotonic() + self.ttl)
+
+    def forget(self, handle=None, _object=None):
+        """Drop one cached object, or the whole cache"""
+        with self._lock:
+            if handle is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(_key(handle, _object), None)
+
+    def _check(self, key):
+        with self._lock:
+            event = self._pending.get(key)
+            owner = event is None
+            if owner:
+                event = self._pending[key] = threading.Event()
+        if not owner:
+            event.wait()
+            exists = self.cached(*key)
+            if exists is None:
+                # checking thread failed, try on our own
+                return self._check(key)
+            return exists
+        try:
+            # checked meanwhile by a call which just finished
+            exists = self.cached(*key)
+            if exists is None:
+                exists = not self.api.check_object(*key)
+                self.remember(*key, exists)
+            return exists
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+
+    def check(self, objects):
+        """
+        Check (handle, object type) pairs.
+
+        :return tuple ({key: exists}, {key: error}), keys are normalized
+            (handle, object type) pairs
+        """
+        results = {}
+        unknown = []
+        for handle, _object in objects:
+            key = _key(handle, _object)
+            if key in results:
+                continue
+            exists = self.cached(*key)
+            results[key] = exists
+            if exists is None:
+                unknown.append(key)
+
+        errors = {}
+        batch = run_parallel(
+            self._check, unknown, self.workers, self.rate, self.limiter
+        )
+        for result in batch:
+            if result.error is None:
+                results[result.item] = result.result
+            else:
+                del results[result.item]
+                errors[result.item] = result.error
+        return results, errors
+
+    def exists(self, handle, _object):
+        """Return True when the object exists in the registry"""
+        exists = self.cached(handle, _object)
+        if exists is None:
+            exists = self._check(_key(handle, _object))
+        return exists
+
+    def validate(self, objects):
+        """
+        Split (handle, object type) pairs to existing, missing and failed.
+
+        :return tuple (found list, missing list, {key: error})
+        """
+        results, errors = self.check(objects)
+        found = [key for key, exists in results.items() if exists]
+        missing = [key for key, exists in results.items() if not exists]
+        return found, missing, errors
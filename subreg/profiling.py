@@ -0,0 +1,258 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Profiling of slow :class:`subreg.Api` calls.
+
+Enable at runtime with :func:`enable`, or before start with environment
+variables:
+
+- ``SUBREG_PROFILE``: ``1`` for all commands, or comma separated
+  commands, e.g. ``Get_DNS_Zone,Info_Domain``
+- ``SUBREG_PROFILE_SLOWEST``: number of slowest calls kept (default 20)
+- ``SUBREG_PROFILE_SAMPLE``: fraction of calls profiled (default 1)
+- ``SUBREG_PROFILE_DUMP``: file the report is written to at exit
+
+When disabled, the only cost per call is one global lookup.
+"""
+
+import atexit
+import contextvars
+import cProfile
+import heapq
+import io
+import itertools
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+
+ProfiledCall = namedtuple(
+    "ProfiledCall",
+    [
+        "command",
+        "started",
+        "duration",
+        "request_size",
+        "response_size",
+        "memory_peak",
+        "profile",
+    ],
+)
+ProfiledCall.__doc__ = """
+Single profiled call: `started` epoch seconds, `duration` seconds, HTTP
+body sizes in bytes, peak of traced memory in bytes during the call and
+its :class:`cProfile.Profile` (None when not sampled or another call was
+being profiled at the same time).
+"""
+
+
+class _Profiler:
+    def __init__(self, commands, slowest, sample, memory):
+        self.commands = frozenset(commands) if commands else None
+        self.slowest = slowest
+        self.sample = sample
+        self.memory = memory
+        self.calls = []
+        self.lock = threading.Lock()
+        # one cProfile / tracemalloc measurement at a time
+        self.busy = threading.Lock()
+        self.counter = itertools.count()
+
+    def keep(self, call):
+        # min-heap of the slowest calls, the fastest is replaced first
+        item = (call.duration, next(self.counter), call)
+        with self.lock:
+            if len(self.calls) < self.slowest:
+                heapq.heappush(self.calls, item)
+            elif call.duration > self.calls[0][0]:
+                heapq.heapreplace(self.calls, item)
+
+
+_profiler = None
+_current_call = contextvars.ContextVar("subreg_profiled_call", default=None)
+
+
+def enable(commands=None, slowest=20, sample=1.0, memory=True):
+    """
+    Enable profiling of :class:`subreg.Api` calls.
+
+    :param list commands: Profiled commands, e.g. ``["Get_DNS_Zone"]``,
+        all when omitted
+    :param int slowest: Number of slowest calls kept
+    :param float sample: Fraction of calls profiled by cProfile, the others
+        are only timed
+    :param bool memory: Trace memory allocations of measured calls with
+        tracemalloc, started only for the call unless already tracing
+    """
+    global _profiler
+    _profiler = _Profiler(commands, slowest, sample, memory)
+
+
+def disable():
+    """Disable profiling, collected calls are dropped"""
+    global _profiler
+    _profiler = None
+
+
+def is_enabled():
+    return _profiler is not None
+
+
+@contextmanager
+def _profile(profiler, command):
+    sizes = [None, None]
+    profile = None
+    tracing = False
+    measured = random.random() < profiler.sample and profiler.busy.acquire(False)
+    if measured:
+        if profiler.memory:
+            # trace only the measured call, never stop tracing of others
+            tracing = not tracemalloc.is_tracing()
+            if tracing:
+                tracemalloc.start()
+            elif hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiling tool is active
+            profile = None
+    token = _current_call.set(sizes)
+    started = time.time()
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - begin
+        _current_call.reset(token)
+        peak = None
+        if measured:
+            if profile is not None:
+                profile.disable()
+            if profiler.memory:
+                peak = tracemalloc.get_traced_memory()[1]
+            if tracing:
+                tracemalloc.stop()
+            profiler.busy.release()
+        profiler.keep(
+            ProfiledCall(command, started, duration, sizes[0], sizes[1], peak, profile)
+        )
+
+
+def profile(command):
+    """
+    Context manager profiling call of `command`, does nothing when
+    profiling is disabled or the command is not selected.
+    """
+    profiler = _profiler
+    if profiler is None or (
+        profiler.commands is not None and command not in profiler.commands
+    ):
+        return nullcontext()
+    return _profile(profiler, command)
+
+
+def _response_hook(response, *args, **kwargs):
+    sizes = _current_call.get()
+    if sizes is not None:
+        body = response.request.body
+        sizes[0] = len(body) if body else 0
+        sizes[1] = len(response.content)
+    return response
+
+
+def instrument_session(session):
+    """Report payload sizes of `session` requests to profiled calls"""
+    if _response_hook not in session.hooks["response"]:
+        session.hooks["response"].append(_response_hook)
+
+
+def slowest():
+    """Return kept :class:`ProfiledCall` list, slowest first"""
+    if _profiler is None:
+        return []
+    with _profiler.lock:
+        calls = list(_profiler.calls)
+    return [call for _, _, call in sorted(calls, reverse=True)]
+
+
+def reset():
+    """Drop kept calls"""
+    if _profiler is not None:
+        with _profiler.lock:
+            _profiler.calls.clear()
+
+
+def _size(value):
+    return "-" if value is None else f"{value} B"
+
+
+def dump(path=None, limit=25, sort="cumulative"):
+    """
+    Return text report of the slowest calls with their profiles, write it
+    to `path` when given.
+
+    :param int limit: Number of functions listed per profile
+    :param str sort: :mod:`pstats` sort key
+    """
+    out = io.StringIO()
+    for call in slowest():
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(call.started))
+        out.write(
+            f"{call.command} at {started} took {call.duration * 1000:.1f} ms,"
+            f" request {_size(call.request_size)}, response"
+            f" {_size(call.response_size)}, memory peak {_size(call.memory_peak)}\n"
+        )
+        if call.profile is not None:
+            stats = pstats.Stats(call.profile, stream=out)
+            stats.sort_stats(sort).print_stats(limit)
+        out.write("\n")
+    report = out.getvalue()
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(report)
+    return report
+
+
+def _enable_from_environment():
+    commands = os.environ.get("SUBREG_PROFILE", "").strip()
+    if not commands or commands == "0":
+        return
+    enable(
+        commands=None if commands == "1" else commands.split(","),
+        slowest=int(os.environ.get("SUBREG_PROFILE_SLOWEST", 20)),
+        sample=float(os.environ.get("SUBREG_PROFILE_SAMPLE", 1.0)),
+    )
+    path = os.environ.get("SUBREG_PROFILE_DUMP")
+    if path:
+        atexit.register(dump, path)
+
+
+_enable_from_environment()
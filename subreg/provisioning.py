@@ -0,0 +1,246 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from collections import namedtuple
+
+from subreg.batch import run_parallel
+from subreg.dns import normalize_record, relative_name
+from subreg.exceptions import ApiError
+from subreg.utils import get_value
+from subreg.watcher import RECORD_FIELDS
+
+# (major, minor) codes of :class:`subreg.ApiError` for a missing zone
+ZONE_MISSING_ERRORS = ((500, 201),)
+
+# Server managed record types never deleted by provisioning
+PROTECTED_TYPES = ("NS", "SOA")
+
+ZoneTemplate = namedtuple("ZoneTemplate", ["records", "template"])
+ZoneTemplate.__new__.__defaults__ = (None,)
+ZoneTemplate.__doc__ = """
+Named zone template: `records` is a list of record dicts, `{domain}` in
+their content is replaced by the provisioned domain. `template` is an
+optional server-side DNS template ID or name passed to `Add_DNS_Zone`
+when the zone is created.
+"""
+
+
+def _identity(record):
+    # (name, type) identify records replaced by overrides
+    return record["name"], record["type"]
+
+
+class ZoneProvisioner:
+    """
+    Provision DNS zones of many domains from named templates.
+
+    The wanted zone of a domain is its template records with per-domain
+    overrides: an override record replaces all template records with the
+    same name and type, an override without `content` just removes them.
+    Every domain is then handled in parallel:
+
+    - a missing zone is created by `Add_DNS_Zone` and filled,
+    - an existing zone already holding exactly the wanted records is
+      skipped without any change,
+    - otherwise missing records are added and records with the name and
+      type of a template or override record, but not wanted, deleted.
+
+    Records of other names and types, NS and SOA records and records
+    created by a server-side template of a new zone are never deleted.
+
+    Records are compared normalized (see :func:`subreg.dns.normalize_record`),
+    `prio` and `ttl` only when the wanted record sets them.
+
+    >>> provisioner = ZoneProvisioner(api, {
+    ...     "web": ZoneTemplate([
+    ...         {"name": "", "type": "A", "content": "192.0.2.1"},
+    ...         {"name": "www", "type": "CNAME", "content": "{domain}"},
+    ...     ]),
+    ... })
+    >>> report = provisioner.run([
+    ...     ("example.com", "web", None),
+    ...     ("example.org", "web", [{"name": "", "type": "A",
+    ...                              "content": "192.0.2.2"}]),
+    ... ])
+
+    :param Api api: Logged in API instance
+    :param dict templates: {name: :class:`ZoneTemplate` or list of records}
+    :param int workers: Maximum number of domains provisioned concurrently
+    :param float rate: Maximum number of domains started per second
+    :param AdaptiveLimiter limiter: Optional adaptive concurrency limit
+    """
+
+    def __init__(self, api, templates, workers=8, rate=None, limiter=None):
+        self.api = api
+        self.templates = {
+            name: (
+                template
+                if isinstance(template, ZoneTemplate)
+                else ZoneTemplate(list(template))
+            )
+            for name, template in templates.items()
+        }
+        self.workers = workers
+        self.rate = rate
+        self.limiter = limiter
+
+    def records(self, domain, template, overrides=None):
+        """Return wanted normalized records of `domain`"""
+        if template not in self.templates:
+            raise KeyError(f"Unknown zone template {template!r}.")
+        records = []
+        for record in self.templates[template].records:
+            record = dict(record)
+            record["content"] = str(get_value(record, "content", "")).replace(
+                "{domain}", domain
+            )
+            records.append(normalize_record(record))
+
+        overrides = [normalize_record(record) for record in overrides or ()]
+        replaced = {_identity(record) for record in overrides}
+        records = [record for record in records if _identity(record) not in replaced]
+        records.extend(record for record in overrides if record["content"])
+        return records
+
+    def managed(self, template, overrides=None):
+        """Return (name, type) identities of records managed by provisioning"""
+        records = [
+            normalize_record(record) for record in self.templates[template].records
+        ]
+        records.extend(normalize_record(record) for record in overrides or ())
+        return {
+            _identity(record)
+            for record in records
+            if record["type"] not in PROTECTED_TYPES
+        }
+
+    def _current(self, domain):
+        """Return normalized records of existing zone, None when missing"""
+        try:
+            records = list(self.api.iter_dns_zone(domain))
+        except ApiError as e:
+            if (e.major, e.minor) in ZONE_MISSING_ERRORS:
+                return None
+            raise
+        current = []
+        for record in records:
+            record = {
+                field: get_value(record, field) for field in ("id",) + RECORD_FIELDS
+            }
+            record = normalize_record(record)
+            record["name"] = relative_name(record["name"], domain)
+            current.append(record)
+        return current
+
+    @staticmethod
+    def _matches(wanted, record):
+        for field in RECORD_FIELDS:
+            value = wanted.get(field)
+            if value is None and field in ("prio", "ttl"):
+                continue
+            if str(value if value is not None else "") != str(
+                get_value(record, field, "")
+            ):
+                return False
+        return True
+
+    def diff(self, wanted, current):
+        """Return (records to add, records to delete)"""
+        remaining = list(current)
+        add = []
+        for record in wanted:
+            for i, existing in enumerate(remaining):
+                if self._matches(record, existing):
+                    del remaining[i]
+                    break
+            else:
+                add.append(record)
+        return add, remaining
+
+    def provision(self, domain, template, overrides=None):
+        """
+        Provision zone of a single domain
+
+        :return str `created`, `updated` or `skipped`
+        """
+        wanted = self.records(domain, template, overrides)
+        current = self._current(domain)
+        action = "updated"
+        if current is None:
+            if not self.api.add_dns_zone(domain, self.templates[template].template):
+                raise Exception(f"Add_DNS_Zone of {domain} failed.")
+            action = "created"
+            current = self._current(domain) or []
+
+        add, delete = self.diff(wanted, current)
+        if action == "created" and self.templates[template].template:
+            # keep records of the server-side template
+            delete = []
+        else:
+            managed = self.managed(template, overrides)
+            delete = [record for record in delete if _identity(record) in managed]
+        if not add and not delete:
+            return "skipped" if action == "updated" else action
+
+        # add first, so replaced records never leave a gap
+        for record in add:
+            record = {key: value for key, value in record.items() if value is not None}
+            if self.api.add_dns_record(domain, record) is False:
+                raise Exception(
+                    f"Add_DNS_Record {record['name']} {record['type']} failed."
+                )
+        for record in delete:
+            if not self.api.delete_dns_record(domain, record["id"]):
+                raise Exception(f"Delete_DNS_Record {record['id']} failed.")
+        return action
+
+    def run(self, domains):
+        """
+        Provision many domains in parallel
+
+        :param iterable domains: (domain, template name, overrides) tuples
+
+        :return dict report
+            :key `created`: Domains with newly created zone
+            :key `updated`: Domains whose existing zone was changed
+            :key `skipped`: Domains whose zone already matched
+            :key `failed`: {domain: error}
+            :key `counts`: {outcome: number of domains}
+        """
+
+        def provision(item):
+            return self.provision(*item)
+
+        report = {"created": [], "updated": [], "skipped": [], "failed": {}}
+        for result in run_parallel(
+            provision, domains, self.workers, self.rate, self.limiter
+        ):
+            if result.error is None:
+                report[result.result].append(result.item[0])
+            else:
+                report["failed"][result.item[0]] = result.error
+        report["counts"] = {
+            key: len(value) for key, value in report.items() if key != "counts"
+        }
+        return report
@@ -0,0 +1,124 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import base64
+import datetime
+import decimal
+import json
+
+from zeep.xsd import AnyObject, CompoundValue
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+_TAGS = {
+    "__datetime__": datetime.datetime.fromisoformat,
+    "__date__": datetime.date.fromisoformat,
+    "__time__": datetime.time.fromisoformat,
+    "__decimal__": decimal.Decimal,
+    "__bytes__": base64.b64decode,
+}
+
+
+def _default(value):
+    """Encode values json/msgpack do not know natively"""
+    if isinstance(value, CompoundValue):
+        return value.__values__
+    if isinstance(value, AnyObject):
+        return value.value
+    if isinstance(value, datetime.datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {"__time__": value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {"__decimal__": str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def _object_hook(obj):
+    if len(obj) == 1:
+        for tag, decode in _TAGS.items():
+            if tag in obj:
+                return decode(obj[tag])
+    return obj
+
+
+def to_python(value):
+    """
+    Convert API response (zeep value objects) to plain dicts and lists,
+    keeping `Decimal`, `datetime` and `bytes` values as they are.
+    """
+    if isinstance(value, CompoundValue):
+        value = value.__values__
+    elif isinstance(value, AnyObject):
+        value = value.value
+    if isinstance(value, dict):
+        return {key: to_python(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_python(item) for item in value]
+    return value
+
+
+def to_json(value):
+    """
+    Serialize API response to JSON bytes.
+    Values JSON can not represent are tagged, see :func:`from_json`.
+    """
+    return json.dumps(
+        value, default=_default, separators=(",", ":"), ensure_ascii=False
+    ).encode("utf-8")
+
+
+def from_json(data):
+    """Decode :func:`to_json` output into plain dicts and lists"""
+    return json.loads(data, object_hook=_object_hook)
+
+
+def to_msgpack(value):
+    """
+    Serialize API response to msgpack bytes.
+
+    .. note:: Requires `msgpack` package
+    """
+    if msgpack is None:
+        raise ImportError("Install `msgpack` to use msgpack serialization.")
+    return msgpack.packb(value, default=_default, use_bin_type=True)
+
+
+def from_msgpack(data):
+    """
+    Decode :func:`to_msgpack` output into plain dicts and lists
+
+    .. note:: Requires `msgpack` package
+    """
+    if msgpack is None:
+        raise ImportError("Install `msgpack` to use msgpack serialization.")
+    return msgpack.unpackb(data, object_hook=_object_hook, raw=False)
@@ -65,6 +65,25 @@ class SubRegTestCase(unittest.TestCase):
             "Expected return type to be list",
         )
 
+    def test_info_contact(self):
+        contacts = self.subreg.contacts_list()["contacts"]
+        if not contacts:
+            self.skipTest("No contacts on account")
+        contact = self.subreg.info_contact(contacts[0]["id"])
+        self.assertIsNotNone(contact)
+
+    def test_get_accountings(self):
+        self.assertTrue(
+            isinstance(self.subreg.get_accountings("2013-01-01", "2013-12-31"), list),
+            "Expected return type to be list",
+        )
+
+    def test_check_object(self):
+        self.assertTrue(
+            self.subreg.check_object("CID-NOT-EXISTING-DHJASL", "contact"),
+            "Expected non-existant contact to be available",
+        )
+
     def test_invalid_login(self):
         with self.assertRaises(ApiError) as cm:
             Api("invalid", "login")
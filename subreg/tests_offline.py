@@ -0,0 +1,1341 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Offline tests of helpers which need no subreg.cz account, run from the
+repository root (responses are built by ``benchmarks/stub.py``) with::
+
+    python -m unittest subreg.tests_offline
+"""
+
+import base64
+import contextlib
+import contextvars
+import datetime
+import decimal
+import io
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+import unittest
+
+from requests.hooks import dispatch_hook
+
+from benchmarks import stub
+from subreg import ApiError, profiling, serializers, tracing
+from subreg.accounting import AccountingExporter, month_periods
+from subreg.api import Api
+from subreg.autorenew import (
+    AutorenewChange,
+    AutorenewPlanner,
+    expires_within,
+    name_matches,
+)
+from subreg.batch import AdaptiveLimiter, RateLimiter, run_graph, run_parallel
+from subreg.cassette import REDACTED, ReplayTransport, _redact
+from subreg.contacts import ContactIndex
+from subreg.credit import CreditBatch, CreditOperation
+from subreg.dns import iter_zone_records, relative_name, validate_records
+from subreg.documents import decode_document, encode_document
+from subreg.dropcatch import DropCatcher
+from subreg.journal import Journal
+from subreg.keepalive import KeepAlive
+from subreg.migration import NSMigration
+from subreg.nic import ObjectChecker
+from subreg.provisioning import ZoneProvisioner, ZoneTemplate
+from subreg.transfers import TransferPipeline
+from subreg.watcher import ZoneWatcher
+
+
+class FakeSpan:
+    def __init__(self, name, attributes, parent):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.parent = parent
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+
+class FakeTracer:
+    """Tracer keeping finished spans, the current span in a context var"""
+
+    def __init__(self):
+        self.spans = []
+        self._current = contextvars.ContextVar("fake_span", default=None)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def start_as_current_span(self, name, attributes=None):
+        span = FakeSpan(name, attributes, self._current.get())
+        token = self._current.set(span)
+        try:
+            yield span
+        finally:
+            self._current.reset(token)
+            with self._lock:
+                self.spans.append(span)
+
+    def named(self, name):
+        return [span for span in self.spans if span.name == name]
+
+
+class TracingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tracer = FakeTracer()
+        tracing.enable(self.tracer)
+        self.addCleanup(tracing.disable)
+
+
+class FakeObjectApi:
+    def __init__(self, existing=(), fail=(), delay=0):
+        self.existing = set(existing)
+        self.fail = set(fail)
+        self.delay = delay
+        self.calls = []
+
+    def check_object(self, handle, _object):
+        self.calls.append(handle)
+        time.sleep(self.delay)
+        if handle in self.fail:
+            raise ApiError("Registry unavailable", 500, 999)
+        # True when the handle is available, i.e. does not exist
+        return handle not in self.existing
+
+
+class ObjectCheckerTestCase(unittest.TestCase):
+    """Tests for :class:`subreg.nic.ObjectChecker`"""
+
+    def test_batch_is_deduplicated_and_cached(self):
+        api = FakeObjectApi(existing=["CID-A"])
+        checker = ObjectChecker(api)
+        found, missing, failed = checker.validate(
+            [("cid-a", "contact"), ("CID-A ", "contact"), ("CID-B", "contact")]
+        )
+        self.assertEqual(found, [("CID-A", "contact")])
+        self.assertEqual(missing, [("CID-B", "contact")])
+        self.assertEqual(failed, {})
+        self.assertEqual(sorted(api.calls), ["CID-A", "CID-B"])
+        self.assertTrue(checker.exists("CID-A", "contact"))
+        self.assertEqual(len(api.calls), 2)
+
+    def test_expired_entries_are_checked_again(self):
+        api = FakeObjectApi(existing=["CID-A"])
+        checker = ObjectChecker(api, ttl=-1)
+        self.assertTrue(checker.exists("CID-A", "contact"))
+        self.assertIsNone(checker.cached("CID-A", "contact"))
+        self.assertTrue(checker.exists("CID-A", "contact"))
+        self.assertEqual(len(api.calls), 2)
+
+    def test_failed_checks_are_not_cached(self):
+        api = FakeObjectApi(fail=["CID-A"])
+        checker = ObjectChecker(api)
+        results, errors = checker.check([("CID-A", "contact"), ("CID-B", "contact")])
+        self.assertEqual(results, {("CID-B", "contact"): False})
+        self.assertIsInstance(errors[("CID-A", "contact")], ApiError)
+        api.fail.clear()
+        results, errors = checker.check([("CID-A", "contact")])
+        self.assertEqual(results, {("CID-A", "contact"): False})
+        self.assertEqual(api.calls, ["CID-A", "CID-B", "CID-A"])
+
+    def test_concurrent_checks_share_one_call(self):
+        api = FakeObjectApi(existing=["CID-A"], delay=0.05)
+        checker = ObjectChecker(api)
+        results = run_parallel(
+            lambda _: checker.check([("CID-A", "contact")]), range(4), workers=4
+        )
+        self.assertEqual(api.calls, ["CID-A"])
+        for result in results:
+            self.assertEqual(result.result, ({("CID-A", "contact"): True}, {}))
+
+    def test_unknown_object_type(self):
+        with self.assertRaises(ValueError):
+            ObjectChecker(FakeObjectApi()).exists("CID-A", "domain")
+
+
+class HookedReplayTransport(ReplayTransport):
+    """Replay transport running response hooks of its session"""
+
+    def post(self, address, message, headers):
+        response = super().post(address, message, headers)
+        return dispatch_hook("response", self.session.hooks, response)
+
+
+class ApiTracingTestCase(TracingTestCase):
+    """Tests for :mod:`subreg.tracing` of :class:`subreg.Api` calls"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "cassette.jsonl.gz")
+        stub.write_stub_cassette(
+            path,
+            [
+                ("Login", {"ssid": "stub"}),
+                ("Check_Domain", {"name": "example.cz", "avail": 1}),
+                ("Get_DNS_Zone", None, ("No zone", 500, 201)),
+            ],
+        )
+        transport = HookedReplayTransport(path, latency=0)
+        self.api = Api("user", "password", wsdl=stub.WSDL_URL, transport=transport)
+
+    def test_method_and_command_spans(self):
+        self.api.check_domain("example.cz")
+        method = self.tracer.named("Api.check_domain")[0]
+        command = self.tracer.named("Subreg Check_Domain")[0]
+        self.assertIsNone(method.parent)
+        self.assertIs(command.parent, method)
+        self.assertEqual(method.attributes, {"subreg.domain": "example.cz"})
+        self.assertEqual(command.attributes["subreg.command"], "Check_Domain")
+        self.assertEqual(command.attributes["subreg.domain"], "example.cz")
+        self.assertGreater(command.attributes["subreg.response_size"], 0)
+        self.assertEqual(len(self.tracer.named("Subreg Login")), 1)
+
+    def test_error_attributes(self):
+        with self.assertRaises(ApiError):
+            self.api.get_dns_zone("example.cz")
+        command = self.tracer.named("Subreg Get_DNS_Zone")[0]
+        self.assertEqual(command.attributes["subreg.error.major"], 500)
+        self.assertEqual(command.attributes["subreg.error.minor"], 201)
+        self.assertEqual(command.attributes["subreg.error.message"], "No zone")
+
+    def test_worker_spans_nest_under_caller(self):
+        with tracing.span("batch") as parent:
+            results = run_parallel(
+                self.api.check_domain, ["a.cz", "b.cz", "c.cz"], workers=3
+            )
+        self.assertTrue(all(result.error is None for result in results))
+        methods = self.tracer.named("Api.check_domain")
+        self.assertEqual(len(methods), 3)
+        self.assertTrue(all(span.parent is parent for span in methods))
+        commands = self.tracer.named("Subreg Check_Domain")
+        self.assertEqual({span.parent for span in commands}, set(methods))
+
+    def test_disabled(self):
+        tracing.disable()
+        self.api.check_domain("example.cz")
+        self.assertEqual(self.tracer.named("Api.check_domain"), [])
+
+
+class FakeContactsApi:
+    def __init__(self, contacts):
+        self.contacts = contacts
+        self.created = []
+
+    def contacts_list(self):
+        return {"contacts": [dict(contact) for contact in self.contacts]}
+
+    def create_contact(self, **contact):
+        self.created.append(contact)
+        return 100 + len(self.created)
+
+    def update_contact(self, **contact):
+        return contact["id"]
+
+
+class ContactIndexTestCase(unittest.TestCase):
+    """Tests for :class:`subreg.contacts.ContactIndex`"""
+
+    def setUp(self):
+        person = {"name": "Jan", "surname": "Novak", "email": "jan@example.com"}
+        self.api = FakeContactsApi([dict(person, id=1), dict(person, id=2)])
+        self.index = ContactIndex(self.api)
+
+    def test_get_or_create_loads_index(self):
+        contact = {"name": " jan ", "surname": "NOVAK", "email": "jan@example.com"}
+        self.assertEqual(self.index.get_or_create(contact), "1")
+        self.assertEqual(self.api.created, [])
+
+    def test_get_or_create_creates_once(self):
+        contact = {"name": "Eva", "surname": "Dvorak", "email": "eva@example.com"}
+        first = self.index.get_or_create(contact)
+        self.assertEqual(self.index.get_or_create(dict(contact)), first)
+        self.assertEqual(len(self.api.created), 1)
+
+    def test_bulk_update_merges_fields(self):
+        self.index.load()
+        update = {"id": 2, "email": "novak@example.com", "phone": "+420.123"}
+        report = self.index.bulk_update([update])
+        self.assertEqual(report["updated"], [2])
+        contact = self.index.get(2)
+        self.assertEqual(contact["name"], "Jan")
+        self.assertEqual(contact["email"], "novak@example.com")
+        self.assertEqual(self.index.find(contact), "2")
+
+    def test_bulk_update_keeps_identity_of_other_contact(self):
+        self.index.load()
+        person = self.index.get(1)
+        self.index.bulk_update([{"id": 2, "email": "novak@example.com"}])
+        self.assertEqual(self.index.find(person), "1")
+
+
+class SerializersTestCase(unittest.TestCase):
+    """Tests for :mod:`subreg.serializers`"""
+
+    value = {
+        "credit": decimal.Decimal("1234.50"),
+        "date": datetime.date(2026, 10, 1),
+        "time": datetime.datetime(2026, 10, 1, 12, 30, 5),
+        "data": b"\x00\xff",
+        "domains": [{"name": "example.cz", "autorenew": 1}],
+    }
+
+    def test_json_round_trip(self):
+        data = serializers.to_json(self.value)
+        self.assertEqual(serializers.from_json(data), self.value)
+
+    @unittest.skipIf(serializers.msgpack is None, "msgpack is not installed")
+    def test_msgpack_round_trip(self):
+        data = serializers.to_msgpack(self.value)
+        self.assertEqual(serializers.from_msgpack(data), self.value)
+
+
+class ShortReader(io.BytesIO):
+    """Binary file returning fewer bytes than requested"""
+
+    def read(self, size=-1):
+        if size is not None and size > 1:
+            size -= 1
+        return super().read(size)
+
+
+class DocumentsTestCase(unittest.TestCase):
+    """Tests for :mod:`subreg.documents`"""
+
+    content = bytes(range(256)) * 3 + b"tail"
+
+    def test_round_trip(self):
+        for size in (0, 1, 2, 3, 4, 5, 100, len(self.content)):
+            content = self.content[:size]
+            for chunk_size in (1, 3, 7, 8, 10, 4096):
+                document = encode_document(io.BytesIO(content), chunk_size)
+                self.assertEqual(document, base64.b64encode(content).decode())
+                out = io.BytesIO()
+                self.assertEqual(decode_document(document, out, chunk_size), size)
+                self.assertEqual(out.getvalue(), content)
+
+    def test_short_reads(self):
+        for chunk_size in (3, 7, 12):
+            document = encode_document(ShortReader(self.content), chunk_size)
+            self.assertEqual(document, base64.b64encode(self.content).decode())
+
+    def test_decode_whitespace(self):
+        document = base64.b64encode(self.content).decode()
+        spaced = " ".join(document[i : i + 5] for i in range(0, len(document), 5))
+        for separated in (spaced, spaced.replace(" ", "\t"), spaced + "\r\n"):
+            out = io.BytesIO()
+            decode_document(separated.encode(), out, chunk_size=8)
+            self.assertEqual(out.getvalue(), self.content)
+
+    def test_decode_invalid(self):
+        with self.assertRaises(ValueError):
+            decode_document("AAA*", io.BytesIO())
+
+
+class CassetteTestCase(unittest.TestCase):
+    """Tests for :mod:`subreg.cassette`"""
+
+    def test_redact_secrets(self):
+        message = (
+            '<ns0:Login xmlns:ns0="urn:x"><login>user</login>'
+            "<password>s3cret</password><ssid>abc</ssid></ns0:Login>"
+        )
+        redacted = _redact(message)
+        self.assertNotIn("s3cret", redacted)
+        self.assertNotIn("abc", redacted)
+        self.assertIn("<login>user</login>", redacted)
+        self.assertEqual(redacted.count(REDACTED), 2)
+
+    def test_redact_namespaced_secrets(self):
+        message = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<ns0:Login xmlns:ns0="urn:x"><ns1:password xmlns:ns1="http://x/y">'
+            "s3cret</ns1:password><data><ssid><item>abc</item></ssid></data>"
+            "</ns0:Login>"
+        )
+        redacted = _redact(message)
+        self.assertNotIn("s3cret", redacted)
+        self.assertNotIn("abc", redacted)
+        self.assertEqual(redacted.count(REDACTED), 2)
+
+    def test_redact_keeps_other_messages(self):
+        message = "<html><body>Bad gateway</body></html>"
+        self.assertEqual(_redact(message), message)
+
+
+class ValidateRecordsTestCase(unittest.TestCase):
+    """Tests for :func:`subreg.dns.validate_records`"""
+
+    zone = [
+        {"id": 1, "name": "example.cz", "type": "A", "content": "192.0.2.1"},
+        {"id": 2, "name": "www.example.cz", "type": "CNAME", "content": "example.cz"},
+    ]
+
+    def test_relative_name(self):
+        self.assertEqual(relative_name("WWW.Example.CZ.", "example.cz"), "www")
+        self.assertEqual(relative_name("example.cz", "example.cz"), "")
+        self.assertEqual(relative_name("@"), "")
+        self.assertEqual(relative_name("mail"), "mail")
+
+    def test_valid_records_are_normalized(self):
+        valid, invalid = validate_records(
+            [{"name": "Mail.", "type": "mx", "content": "MX.Example.CZ.", "prio": 10}]
+        )
+        self.assertEqual(invalid, [])
+        self.assertEqual(valid[0]["name"], "mail")
+        self.assertEqual(valid[0]["type"], "MX")
+        self.assertEqual(valid[0]["content"], "mx.example.cz")
+
+    def test_invalid_record(self):
+        valid, invalid = validate_records(
+            [{"name": "", "type": "A", "content": "not-an-ip"}]
+        )
+        self.assertEqual(valid, [])
+        self.assertEqual(len(invalid), 1)
+
+    def test_cname_conflicts_with_zone(self):
+        records = [
+            {"name": "www", "type": "A", "content": "192.0.2.2"},
+            {"name": "", "type": "CNAME", "content": "example.net"},
+        ]
+        valid, invalid = validate_records(records, self.zone, "example.cz")
+        self.assertEqual(valid, [])
+        self.assertEqual(len(invalid), 2)
+
+    def test_cname_conflicts_within_records(self):
+        records = [
+            {"name": "ftp", "type": "CNAME", "content": "example.net"},
+            {"name": "ftp", "type": "TXT", "content": "text"},
+        ]
+        valid, invalid = validate_records(records)
+        self.assertEqual([record["type"] for record in valid], ["CNAME"])
+        self.assertEqual(len(invalid), 1)
+
+
+class IterZoneRecordsTestCase(unittest.TestCase):
+    """Tests for :func:`subreg.dns.iter_zone_records`"""
+
+    records = stub.zone(6, mx=2)
+
+    def parse(self, **kwargs):
+        content = stub.response("Get_DNS_Zone", {"records": self.records})
+        return list(iter_zone_records(content.encode("utf-8"), **kwargs))
+
+    def test_all_records(self):
+        # empty elements are None, like in records parsed by zeep
+        expected = [
+            dict(record, name=record["name"] or None) for record in self.records
+        ]
+        self.assertEqual(self.parse(), expected)
+
+    def test_filters(self):
+        records = self.parse(types=["mx"])
+        self.assertEqual([record["type"] for record in records], ["MX", "MX"])
+        records = self.parse(names=["HOST1.", "host3"], types=["A", "TXT"])
+        self.assertEqual([record["name"] for record in records], ["host1", "host3"])
+        self.assertEqual(self.parse(names=[""], types=["A"]), [])
+
+    def test_error(self):
+        content = stub.response("Get_DNS_Zone", error=("No zone", 500, 201))
+        with self.assertRaises(ApiError) as cm:
+            list(iter_zone_records(content.encode("utf-8")))
+        self.assertEqual((cm.exception.major, cm.exception.minor), (500, 201))
+        self.assertEqual(cm.exception.message, "No zone")
+
+    def test_same_as_get_dns_zone(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "cassette.jsonl.gz")
+        data = {"domain": "example.com", "records": self.records}
+        stub.write_stub_cassette(
+            path,
+            [
+                ("Login", {"ssid": "stub"}),
+                ("Get_DNS_Zone", data),
+                ("Get_DNS_Zone", data),
+            ],
+        )
+        api = stub.stub_api(path)
+        expected = [
+            {field: record[field] for field in self.records[0]}
+            for record in api.get_dns_zone("example.com")
+        ]
+        self.assertEqual(list(api.iter_dns_zone("example.com")), expected)
+
+
+class FakeZoneApi:
+    def __init__(self):
+        self.zones = {}
+        self.polls = []
+
+    def get_dns_zone(self, domain):
+        self.polls.append(domain)
+        return list(self.zones.get(domain, []))
+
+
+class ZoneWatcherTestCase(unittest.TestCase):
+    """Tests for :class:`subreg.watcher.ZoneWatcher`"""
+
+    def setUp(self):
+        self.api = FakeZoneApi()
+        self.changes = []
+        self.watcher = ZoneWatcher(
+            self.api, [], self.changes.append, min_interval=0, jitter=0
+        )
+
+    def test_detects_change(self):
+        self.watcher.add("example.cz", delay=0)
+        self.watcher.poll_due()
+        record = {"id": 1, "name": "", "type": "A", "content": "192.0.2.1"}
+        self.api.zones["example.cz"] = [record]
+        self.watcher.poll_due()
+        self.assertEqual(len(self.changes), 1)
+        self.assertEqual(self.changes[0].added[0]["content"], "192.0.2.1")
+
+    def test_remove_and_add_polls_once(self):
+        self.watcher.add("example.cz", delay=0)
+        self.watcher.remove("example.cz")
+        self.watcher.add("example.cz", delay=0)
+        for _ in range(3):
+            self.watcher.poll_due()
+        self.assertEqual(self.api.polls, ["example.cz"] * 3)
+
+    def test_remove_from_callback(self):
+        self.watcher.add("example.cz", delay=0)
+        self.watcher.poll_due()
+        self.api.zones["example.cz"] = [{"id": 1, "type": "A", "content": "x"}]
+        self.watcher.callback = lambda change: self.watcher.remove(change.domain)
+        self.watcher.poll_due()
+        self.assertIsNone(self.watcher.next_due())
+
+    def test_remove_during_failed_poll(self):
+        def get_dns_zone(domain):
+            self.watcher.remove(domain)
+            raise ValueError("zone removed meanwhile")
+
+        self.api.get_dns_zone = get_dns_zone
+        self.watcher.add("example.cz", delay=0)
+        self.assertEqual(self.watcher.poll_due(), [])
+        self.assertIsNone(self.watcher.next_due())
+
+
+class JournalTestCase(unittest.TestCase):
+    """Tests for :class:`subreg.journal.Journal`"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "journal")
+        self.calls = []
+
+    def add_record(self, domain, content):
+        self.calls.append((domain, content))
+        return len(self.calls)
+
+    def test_replay_skips_done(self):
+        with Journal(self.path, fsync=False) as journal:
+            self.assertEqual(journal.call(self.add_record, "example.cz", "a"), 1)
+        with Journal(self.path, fsync=False) as journal:
+            key = Journal.key("add_record", "example.cz", "a")
+            self.assertTrue(journal.is_done(key))
+            self.assertEqual(journal.call(self.add_record, "example.cz", "a"), 1)
+            journal.call(self.add_record, "example.cz", "b")
+        self.assertEqual(len(self.calls), 2)
+
+    def test_replay_intent_without_outcome(self):
+        with Journal(self.path, fsync=False) as journal:
+            key = Journal.key("add_record", "example.cz", "a")
+            journal._write({"key": key, "state": "intent", "op": "add_record"})
+        with open(self.path, "a") as f:
+            # torn line of a crash
+            f.write('{"key": "')
+        with Journal(self.path, fsync=False) as journal:
+            self.assertEqual([entry["key"] for entry in journal.pending()], [key])
+            self.assertFalse(journal.is_done(key))
+
+    def test_failed_call_is_not_done(self):
+        def reject():
+            raise ValueError("rejected")
+
+        with Journal(self.path, fsync=False) as journal:
+            with self.assertRaises(ValueError):
+                journal.call(reject, key="k")
+            self.assertIs(journal.call(lambda: False, key="f"), False)
+        with Journal(self.path, fsync=False) as journal:
+            self.assertFalse(journal.is_done("k"))
+            self.assertFalse(journal.is_done("f"))
+            self.assertEqual(journal.pending(), [])
+
+    def test_concurrent_call_is_refused(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return "done"
+
+        with Journal(self.path, fsync=False) as journal:
+            thread = threading.Thread(
+                target=journal.call, args=(slow,), kwargs={"key": "k"}
+            )
+            thread.start()
+            started.wait(5)
+            with self.assertRaises(Exception):
+                journal.call(slow, key="k")
+            release.set()
+            thread.join()
+            self.assertEqual(journal.call(slow, key="k"), "done")
+
+
+class AdaptiveLimiterTestCase(unittest.TestCase):
+    """Tests for :class:`subreg.batch.AdaptiveLimiter`"""
+
+    def call(self, limiter, latency=0.1, error=None):
+        limiter.acquire()
+        limiter.release(latency, error)
+
+    def test_additive_increase(self):
+        limiter = AdaptiveLimiter(initial=2, maximum=4)
+        for _ in range(2 + 3):
+            self.call(limiter)
+        self.assertEqual(limiter.limit, 4)
+        for _ in range(10):
+            self.call(limiter)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_decrease_on_transport_error(self):
+        limiter = AdaptiveLimiter(initial=8)
+        for _ in range(8):
+            self.call(limiter, error=ConnectionError())
+        # one burst of errors decreases the limit once
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.decisions[-1].reason, "throttled")
+
+    def test_decrease_on_latency(self):
+        limiter = AdaptiveLimiter(initial=2, minimum=1)
+        self.call(limiter, latency=0.1)
+        self.call(limiter, latency=0.5)
+        self.assertEqual(limiter.limit, 1)
+        self.assertEqual(limiter.decisions[-1].reason, "latency")
+
+    def test_api_error_is_not_throttle_by_default(self):
+        limiter = AdaptiveLimiter(initial=2, throttle_codes=[(500, 999)])
+        self.call(limiter, error=ApiError("No zone", 500, 201))
+        self.call(limiter, error=ApiError("No zone", 500, 201))
+        self.assertEqual(limiter.limit, 2)
+        self.call(limiter, error=ApiError("Too many", 500, 999))
+        self.assertEqual(limiter.limit, 1)
+        self.assertEqual(limiter.throttled, 1)
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    """Tests for :class:`subreg.batch.RateLimiter`"""
+
+    def test_rate(self):
+        limiter = RateLimiter(50, burst=2)
+        start = time.monotonic()
+        for _ in range(7):
+            limiter.acquire()
+        # burst of 2, then 5 calls 20 ms apart
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(0)
+
+
+class RunParallelTestCase(unittest.TestCase):
+    """Tests for :func:`subreg.batch.run_parallel`"""
+
+    def test_results_in_order_with_errors(self):
+        def func(item):
+            if item == 3:
+                raise ValueError(item)
+            time.sleep(0.01 * (5 - item))
+            return item * 2
+
+        results = run_parallel(func, range(5), workers=5)
+        self.assertEqual([result.item for result in results], [0, 1, 2, 3, 4])
+        self.assertEqual([result.result for result in results], [0, 2, 4, None, 8])
+        self.assertIsInstance(results[3].error, ValueError)
+
+    def test_concurrency(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def func(item):
+            with lock:
+                running.append(item)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(item)
+
+        run_parallel(func, range(12), workers=3)
+        self.assertLessEqual(max(peak), 3)
+
+    def test_empty(self):
+        self.assertEqual(run_parallel(print, []), [])
+
+
+class FakeAutorenewApi:
+    def __init__(self, domains, fail=()):
+        self.domains = domains
+        self.fail = set(fail)
+        self.calls = []
+
+    def domains_list(self):
+        return {"domains": self.domains}
+
+    def _request(self, command, kwargs):
+        self.calls.append((command, kwargs["domain"], kwargs["autorenew"]))
+        if kwargs["domain"] in self.fail:
+            raise ApiError("Domain is locked", 500, 999)
+        return {}
+
+
+class AutorenewPlannerTestCase(unittest.TestCase):
+    """Tests for :class:`subreg.autorenew.AutorenewPlanner`"""
+
+    today = datetime.date(2026, 10, 1)
+    domains = [
+        {"name": "soon.cz", "expire": "2026-10-10", "autorenew": 0},
+        {"name": "later.cz", "expire": "2027-06-01", "autorenew": 0},
+        {"name": "done.com", "expire": "2026-10-05", "autorenew": "AUTORENEW"},
+        {"name": "other.com", "expire": "2027-06-01", "autorenew": 2},
+    ]
+    rules = [
+        expires_within(30, "AUTORENEW"),
+        name_matches("*.cz", "RENEWONCE"),
+    ]
+
+    def test_plan_first_match_wins_and_skips_noop(self):
+        planner = AutorenewPlanner(FakeAutorenewApi(self.domains), self.rules)
+        self.assertEqual(
+            planner.plan(today=self.today),
+            [
+                AutorenewChange("soon.cz", "EXPIRE", "AUTORENEW"),
+                AutorenewChange("later.cz", "EXPIRE", "RENEWONCE"),
+            ],
+        )
+
+    def test_default_policy(self):
+        planner = AutorenewPlanner(
+            FakeAutorenewApi(self.domains), self.rules, default="EXPIRE"
+        )
+        changes = planner.plan(today=self.today)
+        self.assertIn(AutorenewChange("other.com", "RENEWONCE", "EXPIRE"), changes)
+        self.assertEqual(len(changes), 3)
+
+    def test_apply_reports_errors(self):
+        api = FakeAutorenewApi(self.domains, fail=["later.cz"])
+        planner = AutorenewPlanner(api, self.rules)
+        report = planner.apply(planner.plan(today=self.today))
+        self.assertEqual([change.domain for change in report["changed"]], ["soon.cz"])
+        change, error = report["failed"][0]
+        self.assertEqual(change.domain, "later.cz")
+        self.assertIsInstance(error, ApiError)
+        self.assertEqual(error.minor, 999)
+        self.assertEqual(len(api.calls), 2)
+
+
+class RunGraphTestCase(unittest.TestCase):
+    """Tests for :func:`subreg.batch.run_graph`"""
+
+    def test_dependency_order(self):
+        order = []
+        results, skipped = run_graph(
+            order.append, {"a": set(), "b": {"a"}, "c": {"b"}}, workers=4
+        )
+        self.assertEqual(order, ["a", "b", "c"])
+        self.assertEqual(skipped, [])
+
+    def test_failed_item_skips_dependents(self):
+        def func(item):
+            if item == "a":
+                raise ValueError(item)
+
+        results, skipped = run_graph(
+            func, {"a": set(), "b": {"a"}, "c": {"b"}, "d": set()}
+        )
+        self.assertEqual(sorted(result.item for result in results), ["a", "d"])
+        self.assertEqual(sorted(skipped), ["b", "c"])
+
+    def test_cycle(self):
+        with self.assertRaises(ValueError):
+            run_graph(print, {"a": {"b"}, "b": {"a"}})
+
+    def test_unknown_dependency(self):
+        with self.assertRaises(ValueError):
+            run_graph(print, {"a": {"b"}})
+
+
+class FakeOrdersApi:
+    def __init__(self):
+        self.log = []
+        self.orders = {}
+
+    def _order(self, action, target):
+        order_id = len(self.orders) + 1
+        self.orders[order_id] = 0
+        self.log.append((action, target))
+        return order_id
+
+    def create_host(self, host, ipv4, ipv6):
+        return self._order("create_host", host)
+
+    def modify_ns_domain(self, domain, hosts):
+        return self._order("modify_ns_domain", domain)
+
+    def delete_host(self, host):
+        return self._order("delete_host", host)
+
+    def info_order(self, order_id):
+        # orders complete on the second poll
+        self.orders[order_id] += 1
+        status = "completed" if self.orders[order_id] > 1 else "processing"
+        if status == "completed":
+            self.log.append(("completed", order_id))
+        return {"order": {"id": order_id, "status": status}}
+
+
+class NSMigrationTestCase(unittest.TestCase):
+    """Tests for :class:`subreg.migration.NSMigration`"""
+
+    def test_dependents_wait_for_completed_orders(self):
+        api = FakeOrdersApi()
+        migration = NSMigration(api, interval=0)
+        migration.create_host("ns1.example.net", ipv4=["192.0.2.1"])
+        migration.switch_ns(
+            "example.cz", ["ns1.example.net"], old_hosts=["ns1.example.org"]
+        )
+        migration.delete_host("ns1.example.org")
+        report = migration.run()
+        self.assertEqual(len(report["done"]), 3)
+        self.assertEqual(
+            api.log,
+            [
+                ("create_host", "ns1.example.net"),
+                ("completed", 1),
+                ("modify_ns_domain", "example.cz"),
+                ("completed", 2),
+                ("delete_host", "ns1.example.org"),
+                ("completed", 3),
+            ],
+        )
+
+    def test_failed_order_skips_dependents(self):
+        api = FakeOrdersApi()
+        api.info_order = lambda order_id: {"order": {"status": "error"}}
+        migration = NSMigration(api, interval=0)
+        migration.switch_ns("example.cz", ["ns1.example.net"])
+        migration.delete_host("ns1.example.org")
+        report = migration.run()
+        self.assertEqual(len(report["failed"]), 1)
+        self.assertEqual(len(report["skipped"]), 1)
+
+    def test_limiter_times_orders_without_waits(self):
+        api = FakeOrdersApi()
+        order = api._order
+
+        def slow_order(action, target):
+            time.sleep(0.01)
+            return order(action, target)
+
+        api._order = slow_order
+        limiter = AdaptiveLimiter(initial=2, maximum=2, tolerance=3)
+        migration = NSMigration(api, limiter=limiter, rate=1000, interval=0.05)
+        for i in range(4):
+            migration.create_host(f"ns{i}.example.net", ipv4=["192.0.2.1"])
+        report = migration.run()
+        self.assertEqual(len(report["done"]), 4)
+        self.assertEqual(limiter.completed, 4)
+        # orders take 10 ms, waiting for them at least 50 ms more
+        self.assertLess(limiter.baseline, 0.04)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(list(limiter.decisions), [])
+
+
+class MonthPeriodsTestCase(unittest.TestCase):
+    """Tests for :func:`subreg.accounting.month_periods`"""
+
+    def test_partial_months(self):
+        date = datetime.date
+        self.assertEqual(
+            month_periods("2025-12-15", "2026-02-10"),
+            [
+                (date(2025, 12, 15), date(2025, 12, 31)),
+                (date(2026, 1, 1), date(2026, 1, 31)),
+                (date(2026, 2, 1), date(2026, 2, 10)),
+            ],
+        )
+
+    def test_leap_february(self):
+        periods = month_periods(datetime.date(2024, 2, 1), "2024-02-29")
+        self.assertEqual(
+            periods, [(datetime.date(2024, 2, 1), datetime.date(2024, 2, 29))]
+        )
+
+    def test_empty_range(self):
+        self.assertEqual(month_periods("2026-02-01", "2026-01-31"), [])
+
+
+class FakeAccountingApi:
+    def get_accountings(self, from_date, to_date):
+        with tracing.span("Get_Accountings"):
+            return [{"date": from_date, "text": "x", "sum": 1}]
+
+
+class AccountingExporterTestCase(TracingTestCase):
+    """Tests for :class:`subreg.accounting.AccountingExporter`"""
+
+    def test_worker_spans_have_caller_parent(self):
+        exporter = AccountingExporter(FakeAccountingApi(), workers=2)
+        with tracing.span("export") as parent:
+            rows = list(exporter.iter_rows("2026-01-15", "2026-03-10"))
+        self.assertEqual(len(rows), 3)
+        spans = self.tracer.named("Get_Accountings")
+        self.assertEqual(len(spans), 3)
+        self.assertTrue(all(span.parent is parent for span in spans))
+
+
+class FakePollApi:
+    def __init__(self):
+        self.queue = []
+        self.acked = []
+
+    def transfer_domain(self, domain, authid, params):
+        order_id = 100 + len(self.queue)
+        self.queue.append(
+            {
+                "count": 1,
+                "id": order_id,
+                "orderid": order_id,
+                "orderstatus": "Completed",
+            }
+        )
+        return order_id
+
+    def poll_get(self):
+        if not self.queue:
+            return {"count": 0}
+        return self.queue[0]
+
+    def poll_ack(self, poll_id):
+        self.acked.append(poll_id)
+        self.queue.pop(0)
+
+
+class TransferPipelineTestCase(unittest.TestCase):
+    """Tests for :class:`subreg.transfers.TransferPipeline`"""
+
+    foreign = {"count": 1, "id": 1, "orderid": 1, "orderstatus": "Completed"}
+
+    def test_poll_updates_tracked_orders(self):
+        api = FakePollApi()
+        pipeline = TransferPipeline(api)
+        pipeline.submit([("example.cz", "auth")])
+        self.assertEqual(len(pipeline.poll()), 1)
+        self.assertEqual(pipeline.report(), {"completed": 1})
+        self.assertEqual(pipeline.unfinished(), [])
+
+    def test_poll_stops_at_foreign_message(self):
+        api = FakePollApi()
+        pipeline = TransferPipeline(api)
+        pipeline.submit([("example.cz", "auth")])
+        api.queue.insert(0, dict(self.foreign))
+        pipeline.poll()
+        self.assertEqual(api.acked, [])
+        self.assertEqual(pipeline.blocked["orderid"], 1)
+        self.assertEqual(pipeline.report(), {"submitted": 1})
+
+    def test_track_returns_when_blocked(self):
+        api = FakePollApi()
+        pipeline = TransferPipeline(api)
+        pipeline.submit([("example.cz", "auth")])
+        api.queue.insert(0, dict(self.foreign))
+        unfinished = pipeline.track(interval=60)
+        self.assertEqual([state.domain for state in unfinished], ["example.cz"])
+        self.assertEqual(pipeline.blocked["orderid"], 1)
+
+    def test_poll_passes_foreign_message_to_handler(self):
+        api = FakePollApi()
+        handled = []
+        pipeline = TransferPipeline(api, foreign=lambda m: handled.append(m) or True)
+        pipeline.submit([("example.cz", "auth")])
+        api.queue.insert(0, dict(self.foreign))
+        pipeline.poll()
+        self.assertEqual(len(handled), 1)
+        self.assertEqual(len(api.acked), 2)
+        self.assertEqual(pipeline.report(), {"completed": 1})
+
+
+class FakeCreditApi:
+    def __init__(self):
+        self.credit = {"alice": decimal.Decimal(0), "bob": decimal.Decimal(0)}
+        self.fail = {}
+
+    def users_list(self):
+        return {
+            "users": [
+                {"username": username, "credit": credit}
+                for username, credit in self.credit.items()
+            ]
+        }
+
+    def get_credit(self):
+        return {"credit": {"amount": "1000", "currency": "CZK"}}
+
+    def credit_correction(self, username, amount, reason):
+        error = self.fail.pop(username, None)
+        if isinstance(error, ApiError):
+            raise error
+        self.credit[username] += decimal.Decimal(str(amount))
+        if error is not None:
+            # applied, but the response was lost
+            raise error
+        return {}
+
+
+class CreditBatchTestCase(unittest.TestCase):
+    """Tests for :class:`subreg.credit.CreditBatch`"""
+
+    operations = [
+        CreditOperation("alice", 100, "Top-up 2026-10"),
+        CreditOperation("bob", 100, "Top-up 2026-10"),
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "journal")
+        self.api = FakeCreditApi()
+
+    def run_batch(self):
+        with Journal(self.path, fsync=False) as journal:
+            return CreditBatch(self.api, journal, rate=None).run(self.operations)
+
+    def test_rerun_skips_applied(self):
+        report = self.run_batch()
+        self.assertEqual(report["applied"], 2)
+        self.assertEqual(report["mismatched"], [])
+        report = self.run_batch()
+        self.assertEqual(report["skipped"], 2)
+        self.assertEqual(self.api.credit["bob"], 100)
+
+    def test_duplicate_in_batch_is_applied_once(self):
+        operation = self.operations[0]
+        with Journal(self.path, fsync=False) as journal:
+            batch = CreditBatch(self.api, journal, workers=2, rate=None)
+            report = batch.run([operation, operation])
+        self.assertEqual(report["applied"], 1)
+        self.assertEqual(report["duplicates"], [operation])
+        self.assertEqual(self.api.credit["alice"], 100)
+
+    def test_rejected_operation_is_retried(self):
+        self.api.fail["bob"] = ApiError("Rejected", 500, 1)
+        report = self.run_batch()
+        self.assertEqual(len(report["failed"]), 1)
+        report = self.run_batch()
+        self.assertEqual(report["applied"], 1)
+        self.assertEqual(self.api.credit["bob"], 100)
+
+    def test_timeout_is_never_resent(self):
+        self.api.fail["bob"] = TimeoutError("read timeout")
+        report = self.run_batch()
+        self.assertEqual(len(report["unconfirmed"]), 1)
+        report = self.run_batch()
+        self.assertEqual(report["unconfirmed"][0][0].username, "bob")
+        self.assertEqual(self.api.credit["bob"], 100)
+
+    def test_intent_without_outcome_is_never_resent(self):
+        operation = self.operations[1]
+        with Journal(self.path, fsync=False) as journal:
+            key = CreditBatch(self.api, journal).key(operation)
+            # crash after the call was sent
+            journal._write({"key": key, "state": "intent", "op": "credit"})
+            self.api.credit_correction("bob", 100, operation.reason)
+        report = self.run_batch()
+        self.assertEqual(report["applied"], 1)
+        self.assertEqual(len(report["unconfirmed"]), 1)
+        self.assertEqual(self.api.credit["bob"], 100)
+
+    def test_resolve_unconfirmed(self):
+        self.api.fail["bob"] = TimeoutError("read timeout")
+        self.run_batch()
+        with Journal(self.path, fsync=False) as journal:
+            CreditBatch(self.api, journal).resolve(self.operations[1], applied=True)
+        report = self.run_batch()
+        self.assertEqual(report["skipped"], 2)
+
+
+class FakeSessionApi:
+    pool_size = 1
+
+    def __init__(self, error):
+        self.error = error
+        self.relogins = 0
+        self._credentials = ("user", "password")
+        session = types.SimpleNamespace(hooks={"response": []})
+        self.client = types.SimpleNamespace(
+            transport=types.SimpleNamespace(session=session)
+        )
+
+    def get_credit(self):
+        with tracing.span("Get_Credit"):
+            if self.error is not None:
+                raise self.error
+            return {}
+
+    def relogin(self):
+        self.relogins += 1
+
+
+class KeepAliveTestCase(unittest.TestCase):
+    session_errors = [(500, 999)]
+
+    def test_relogin_on_expired_session(self):
+        api = FakeSessionApi(ApiError("Session expired", 500, 999))
+        keepalive = KeepAlive(api, session_errors=self.session_errors)
+        keepalive.beat()
+        self.assertEqual(api.relogins, 1)
+        self.assertEqual(keepalive.relogins, 1)
+
+    def test_other_errors_do_not_relogin(self):
+        api = FakeSessionApi(ApiError("Internal error", 500, 1))
+        keepalive = KeepAlive(api, session_errors=self.session_errors)
+        with self.assertRaises(ApiError):
+            keepalive.beat()
+        self.assertEqual(api.relogins, 0)
+
+    def test_no_relogin_without_credentials(self):
+        api = FakeSessionApi(ApiError("Session expired", 500, 999))
+        api._credentials = None
+        with self.assertRaises(ApiError):
+            KeepAlive(api, session_errors=self.session_errors).beat()
+        self.assertEqual(api.relogins, 0)
+
+    def test_no_relogin_without_session_errors(self):
+        api = FakeSessionApi(ApiError("Session expired", 500, 999))
+        with self.assertRaises(ApiError):
+            KeepAlive(api).beat()
+        self.assertEqual(api.relogins, 0)
+
+    def test_warm_in_caller_context(self):
+        tracer = FakeTracer()
+        tracing.enable(tracer)
+        self.addCleanup(tracing.disable)
+        keepalive = KeepAlive(FakeSessionApi(None), connections=3)
+        with tracing.span("warm") as parent:
+            keepalive.warm()
+        spans = tracer.named("Get_Credit")
+        self.assertEqual(len(spans), 3)
+        self.assertTrue(all(span.parent is parent for span in spans))
+        self.assertEqual(keepalive.heartbeats, 3)
+
+
+class FakeProvisioningApi:
+    def __init__(self, zones=None, server_templates=None, error=None):
+        self.zones = zones or {}
+        self.server_templates = server_templates or {}
+        self.error = error
+        self.deleted = []
+        self._ids = iter(range(1000, 2000))
+
+    def iter_dns_zone(self, domain):
+        if self.error is not None:
+            raise self.error
+        if domain not in self.zones:
+            raise ApiError("No zone", 500, 201)
+        return iter([dict(record) for record in self.zones[domain]])
+
+    def add_dns_zone(self, domain, template=None):
+        self.zones[domain] = [
+            dict(record, id=next(self._ids))
+            for record in self.server_templates.get(template, [])
+        ]
+        return True
+
+    def add_dns_record(self, domain, record):
+        self.zones[domain].append(dict(record, id=next(self._ids)))
+
+    def delete_dns_record(self, domain, record_id):
+        self.deleted.append(record_id)
+        self.zones[domain] = [
+            record for record in self.zones[domain] if record["id"] != record_id
+        ]
+        return True
+
+
+class ZoneProvisionerTestCase(unittest.TestCase):
+    web = ZoneTemplate(
+        [
+            {"name": "", "type": "A", "content": "192.0.2.1"},
+            {"name": "www", "type": "CNAME", "content": "{domain}"},
+        ]
+    )
+
+    def provision(self, api, template, overrides=None):
+        provisioner = ZoneProvisioner(api, {"web": template})
+        return provisioner.provision("example.com", "web", overrides)
+
+    def test_records_replace_domain(self):
+        template = ZoneTemplate(
+            [{"name": "", "type": "TXT", "content": "{a} {domain}"}]
+        )
+        provisioner = ZoneProvisioner(None, {"web": template})
+        records = provisioner.records("example.com", "web")
+        self.assertEqual(records[0]["content"], "{a} example.com")
+
+    def test_create_and_skip(self):
+        api = FakeProvisioningApi()
+        self.assertEqual(self.provision(api, self.web), "created")
+        self.assertEqual(len(api.zones["example.com"]), 2)
+        self.assertEqual(self.provision(api, self.web), "skipped")
+
+    def test_unmanaged_records_are_kept(self):
+        zone = [
+            {"id": 1, "name": "example.com", "type": "A", "content": "192.0.2.9"},
+            {"id": 2, "name": "example.com", "type": "NS", "content": "ns.test"},
+            {"id": 3, "name": "example.com", "type": "SOA", "content": "ns.test"},
+            {"id": 4, "name": "mail.example.com", "type": "A", "content": "1.2.3.4"},
+        ]
+        api = FakeProvisioningApi({"example.com": zone})
+        self.assertEqual(self.provision(api, self.web), "updated")
+        self.assertEqual(api.deleted, [1])
+        self.assertEqual(self.provision(api, self.web), "skipped")
+
+    def test_server_template_records_are_kept(self):
+        server = [
+            {"name": "", "type": "A", "content": "192.0.2.9"},
+            {"name": "", "type": "MX", "content": "mx.test", "prio": 10},
+        ]
+        api = FakeProvisioningApi(server_templates={"srv": server})
+        self.assertEqual(self.provision(api, ZoneTemplate([], "srv")), "created")
+        self.assertEqual(api.deleted, [])
+        self.assertEqual(len(api.zones["example.com"]), 2)
+
+    def test_override_removes_records(self):
+        api = FakeProvisioningApi()
+        self.provision(api, self.web)
+        override = [{"name": "www", "type": "CNAME"}]
+        self.assertEqual(self.provision(api, self.web, override), "updated")
+        self.assertEqual(len(api.zones["example.com"]), 1)
+
+    def test_other_errors_are_raised(self):
+        api = FakeProvisioningApi(error=ApiError("Internal error", 500, 1))
+        with self.assertRaises(ApiError):
+            self.provision(api, self.web)
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def tearDown(self):
+        profiling.disable()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def call(self, command="Info_Domain"):
+        with profiling.profile(command):
+            self.assertTrue(tracemalloc.is_tracing())
+            [bytes(1000) for _ in range(10)]
+
+    def test_tracing_only_around_measured_calls(self):
+        profiling.enable()
+        self.assertFalse(tracemalloc.is_tracing())
+        self.call()
+        self.assertFalse(tracemalloc.is_tracing())
+        call = profiling.slowest()[0]
+        self.assertEqual(call.command, "Info_Domain")
+        self.assertGreater(call.memory_peak, 0)
+
+    def test_foreign_tracing_is_kept(self):
+        tracemalloc.start()
+        profiling.enable()
+        self.call()
+        profiling.disable()
+        self.assertTrue(tracemalloc.is_tracing())
+
+    def test_raw_and_prepared_requests(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "cassette.jsonl.gz")
+        stub.write_stub_cassette(
+            path,
+            [
+                ("Login", {"ssid": "stub"}),
+                ("Get_DNS_Zone", {"records": stub.zone(4)}),
+                ("Check_Domain", {"name": "example.cz", "avail": 1}),
+            ],
+        )
+        api = stub.stub_api(path)
+        profiling.enable(commands=["Get_DNS_Zone", "Check_Domain"], memory=False)
+        self.assertEqual(len(list(api.iter_dns_zone("example.cz"))), 9)
+        request = api._prepare("Check_Domain", {"domain": "example.cz"})
+        self.assertEqual(request()["avail"], 1)
+        commands = sorted(call.command for call in profiling.slowest())
+        self.assertEqual(commands, ["Check_Domain", "Get_DNS_Zone"])
+
+    def test_unselected_commands_are_not_profiled(self):
+        profiling.enable(commands=["Get_DNS_Zone"])
+        with profiling.profile("Info_Domain"):
+            self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(profiling.slowest(), [])
+
+
+class FakeDropApi:
+    ssid = "ssid"
+
+    def _prepare(self, command, kwargs):
+        def request():
+            with tracing.span(command):
+                if command == "Check_Domain":
+                    return {"avail": 1}
+                return {"orderid": 42}
+
+        return request
+
+
+class DropCatcherTestCase(TracingTestCase):
+    """Tests for :class:`subreg.dropcatch.DropCatcher`"""
+
+    def test_order_placed_once_in_caller_context(self):
+        catcher = DropCatcher(
+            FakeDropApi(), "example.cz", time.time(), attempts=3, parallel=2
+        )
+        with tracing.span("dropcatch") as parent:
+            catcher.prepare()
+            self.assertEqual(catcher.run(), 42)
+        self.assertEqual(len(self.tracer.named("Make_Order")), 1)
+        spans = self.tracer.named("Check_Domain") + self.tracer.named("Make_Order")
+        self.assertTrue(all(span.parent is parent for span in spans))
+
+
+if __name__ == "__main__":
+    unittest.main()
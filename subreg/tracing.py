@@ -0,0 +1,141 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import contextvars
+import functools
+import inspect
+from contextlib import contextmanager, nullcontext
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # pragma: no cover
+    otel_trace = None
+
+_tracer = None
+_current_span = contextvars.ContextVar("subreg_span", default=None)
+
+
+def enable(tracer=None):
+    """
+    Enable tracing of :class:`subreg.Api` calls.
+
+    :param tracer: OpenTelemetry compatible tracer (with
+        `start_as_current_span`), the global OpenTelemetry tracer provider
+        is used when omitted
+    """
+    global _tracer
+    if tracer is None:
+        if otel_trace is None:
+            raise ImportError("Install `opentelemetry-api` or pass a tracer.")
+        tracer = otel_trace.get_tracer("subreg")
+    _tracer = tracer
+
+
+def disable():
+    """Disable tracing"""
+    global _tracer
+    _tracer = None
+
+
+def is_enabled():
+    return _tracer is not None
+
+
+def _attribute(value):
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+
+@contextmanager
+def _span(name, attributes):
+    with _tracer.start_as_current_span(name, attributes=attributes) as span:
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+
+def span(name, **attributes):
+    """
+    Context manager opening span `name` with `attributes` prefixed
+    by ``subreg.``, yields None when tracing is disabled.
+    """
+    if _tracer is None:
+        return nullcontext()
+    return _span(
+        name,
+        {
+            f"subreg.{key}": _attribute(value)
+            for key, value in attributes.items()
+            if value is not None
+        },
+    )
+
+
+def record_error(span, error):
+    """Add major and minor code of :class:`subreg.ApiError` to `span`"""
+    if span is not None:
+        span.set_attribute("subreg.error.major", error.major)
+        span.set_attribute("subreg.error.minor", error.minor)
+        span.set_attribute("subreg.error.message", _attribute(error.message))
+
+
+def _response_hook(response, *args, **kwargs):
+    span = _current_span.get()
+    if span is not None:
+        span.set_attribute("subreg.response_size", len(response.content))
+    return response
+
+
+def instrument_session(session):
+    """Report response sizes of `session` on the current span"""
+    if _response_hook not in session.hooks["response"]:
+        session.hooks["response"].append(_response_hook)
+
+
+def _traced(func, name):
+    parameters = list(inspect.signature(func).parameters)
+    index = parameters.index("domain") if "domain" in parameters else None
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _tracer is None:
+            return func(*args, **kwargs)
+        domain = kwargs.get("domain")
+        if domain is None and index is not None and index < len(args):
+            domain = args[index]
+        with span(name, domain=domain):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def trace_methods(cls):
+    """Class decorator opening a span around every public method"""
+    for name, func in list(vars(cls).items()):
+        if not name.startswith("_") and inspect.isfunction(func):
+            setattr(cls, name, _traced(func, f"{cls.__name__}.{name}"))
+    return cls
@@ -0,0 +1,234 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import csv
+import threading
+import time
+from collections import Counter, namedtuple
+from itertools import islice
+
+from subreg.batch import run_parallel
+from subreg.utils import get_value
+
+# order statuses after which no more poll messages are expected
+FINAL_STATUSES = ("completed", "error", "cancelled", "canceled", "failed")
+
+TransferState = namedtuple(
+    "TransferState", ["domain", "order_id", "status", "message", "error"]
+)
+TransferState.__doc__ = """
+Lifecycle state of one domain transfer. `status` is `pending` before
+submission, `submit_failed` when the order was rejected (`error` holds the
+exception), `submitted` once ordered and the order status from poll
+messages afterwards.
+"""
+
+
+def read_transfers(stream):
+    """
+    Yield (domain, authid) rows from CSV `stream` lazily. Empty rows,
+    rows starting with `#` and a `domain` header row are skipped, a missing
+    auth code is None.
+    """
+    for row in csv.reader(stream):
+        if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+            continue
+        domain = row[0].strip().lower()
+        if domain == "domain":
+            continue
+        authid = row[1].strip() if len(row) > 1 and row[1].strip() else None
+        yield domain, authid
+
+
+class TransferPipeline:
+    """
+    Transfer a domain portfolio: submit `Transfer_Domain` orders
+    concurrently, then follow every order through its lifecycle by
+    consuming the account poll queue, one `POLL_Get` / `POLL_Ack` per
+    status change instead of asking about each order.
+
+    Every state change is passed to `callback` as it happens, so progress
+    can be reported incrementally.
+
+    >>> pipeline = TransferPipeline(api, callback=print)
+    >>> with open("transfers.csv") as stream:
+    ...     pipeline.submit(read_transfers(stream))
+    >>> pipeline.track(interval=60, timeout=86400)
+    >>> pipeline.report()
+
+    :param Api api: Logged in API instance
+    :param callable callback: Called with every changed :class:`TransferState`
+    :param dict params: Order parameters common to all transfers
+    :param int workers: Maximum number of concurrent orders
+    :param float rate: Maximum number of orders per second
+    :param AdaptiveLimiter limiter: Optional adaptive concurrency limit
+    :param int chunk: Rows read from the stream per submitted batch
+    :param callable foreign: Called with poll messages about orders not in
+        the pipeline, the message is acknowledged only when it returns True.
+        Without it polling stops at the first such message and leaves it
+        in the queue for other consumers of the account, see
+        :attr:`blocked`.
+    """
+
+    def __init__(
+        self,
+        api,
+        callback=None,
+        params=None,
+        workers=8,
+        rate=None,
+        limiter=None,
+        chunk=100,
+        foreign=None,
+    ):
+        self.api = api
+        self.callback = callback
+        self.params = params
+        self.workers = workers
+        self.rate = rate
+        self.limiter = limiter
+        self.chunk = chunk
+        self.foreign = foreign
+        # poll message about a foreign order which stopped the last poll
+        self.blocked = None
+        self.states = {}
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def _update(self, domain, **changes):
+        with self._lock:
+            state = self.states[domain]._replace(**changes)
+            self.states[domain] = state
+            if state.order_id is not None:
+                self._orders[state.order_id] = domain
+        if self.callback:
+            self.callback(state)
+        return state
+
+    def _submit(self, row):
+        domain, authid = row
+        order_id = self.api.transfer_domain(domain, authid, self.params)
+        return self._update(domain, order_id=int(order_id), status="submitted")
+
+    def submit(self, rows):
+        """
+        Submit transfers of (domain, authid) `rows`. The iterable is
+        consumed `chunk` rows at a time, so large streams are never held in
+        memory. Domains already in the pipeline are not submitted again.
+
+        :return int number of submitted orders
+        """
+        rows = iter(rows)
+        submitted = 0
+        while True:
+            chunk = list(islice(rows, self.chunk))
+            if not chunk:
+                return submitted
+            batch = []
+            for domain, authid in chunk:
+                if domain not in self.states:
+                    self.states[domain] = TransferState(
+                        domain, None, "pending", None, None
+                    )
+                    batch.append((domain, authid))
+            results = run_parallel(
+                self._submit, batch, self.workers, self.rate, self.limiter
+            )
+            for result in results:
+                if result.error is None:
+                    submitted += 1
+                else:
+                    self._update(
+                        result.item[0], status="submit_failed", error=result.error
+                    )
+
+    def poll(self):
+        """
+        Drain the poll queue, updating states of tracked orders. The queue
+        is shared by the whole account, a message about another order is
+        passed to `foreign` and acknowledged only when it returns True,
+        otherwise polling stops there.
+
+        :return list of changed :class:`TransferState`
+        """
+        changed = []
+        self.blocked = None
+        while True:
+            message = self.api.poll_get()
+            poll_id = get_value(message, "id")
+            if not get_value(message, "count", 0) or poll_id is None:
+                return changed
+            order_id = get_value(message, "orderid")
+            domain = self._orders.get(int(order_id)) if order_id else None
+            if domain is None:
+                if self.foreign is None or not self.foreign(message):
+                    self.blocked = message
+                    return changed
+            else:
+                changed.append(
+                    self._update(
+                        domain,
+                        status=str(get_value(message, "orderstatus", "")).lower(),
+                        message=get_value(message, "message"),
+                    )
+                )
+            self.api.poll_ack(poll_id)
+
+    def unfinished(self):
+        """Return submitted transfers not in one of `FINAL_STATUSES`"""
+        return [
+            state
+            for state in self.states.values()
+            if state.order_id is not None and state.status not in FINAL_STATUSES
+        ]
+
+    def track(self, interval=60, timeout=None, stop=None):
+        """
+        Poll every `interval` seconds until all submitted transfers are
+        finished, `timeout` seconds passed, `stop` event is set or polling
+        is :attr:`blocked` by a foreign message, which no later poll gets
+        past until it is acknowledged.
+
+        :param threading.Event stop: Optional event ending tracking early
+
+        :return list of still unfinished :class:`TransferState`
+        """
+        stop = stop or threading.Event()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.poll()
+            unfinished = self.unfinished()
+            if not unfinished or self.blocked is not None:
+                return unfinished
+            wait = interval
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return unfinished
+            if stop.wait(wait):
+                return unfinished
+
+    def report(self):
+        """Return {status: number of domains}"""
+        return dict(Counter(state.status for state in self.states.values()))
@@ -0,0 +1,234 @@
+# Copyright (c) 2013 Petr Jerabek
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import hashlib
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import namedtuple
+
+from subreg.batch import run_parallel
+from subreg.utils import get_value
+
+RECORD_FIELDS = ("name", "type", "content", "prio", "ttl")
+
+ZoneChange = namedtuple("ZoneChange", ["domain", "added", "removed", "modified"])
+ZoneChange.__doc__ = """
+Records changed in zone since previous poll. `added` and `removed` are
+lists of record dicts, `modified` list of (old, new) record dict tuples.
+"""
+
+
+def _snapshot(records):
+    """Return {record id: record dict} and hash of the zone"""
+    snapshot = {}
+    for record in records:
+        snapshot[str(get_value(record, "id"))] = {
+            field: get_value(record, field) for field in RECORD_FIELDS
+        }
+    digest = hashlib.sha1()
+    for record_id in sorted(snapshot):
+        digest.update(repr((record_id, *snapshot[record_id].values())).encode())
+    return snapshot, digest.hexdigest()
+
+
+def diff_zone(domain, old, new):
+    """Return :class:`ZoneChange` between two zone snapshots"""
+    added = [new[key] for key in new.keys() - old.keys()]
+    removed = [old[key] for key in old.keys() - new.keys()]
+    modified = [
+        (old[key], new[key]) for key in new.keys() & old.keys() if old[key] != new[key]
+    ]
+    return ZoneChange(domain, added, removed, modified)
+
+
+class _Zone:
+    def __init__(self, interval):
+        self.snapshot = None
+        self.hash = None
+        self.interval = interval
+        # sequence number of the only valid queue entry of the zone
+        self.entry = None
+
+
+class ZoneWatcher:
+    """
+    Detect out-of-band changes of DNS zones by polling `Get_DNS_Zone`.
+
+    Each zone keeps its own interval: a changed zone is polled again after
+    `min_interval`, an unchanged one backs off by `backoff` up to
+    `max_interval`. Polls are initially spread evenly over `min_interval`
+    and jittered afterwards, so zones do not come due in bursts.
+
+    :param Api api: Logged in API instance
+    :param list domains: Domains to watch
+    :param callable callback: Called with every :class:`ZoneChange`
+    :param float min_interval: Shortest interval between polls of a zone
+    :param float max_interval: Longest interval between polls of a zone
+    :param float backoff: Interval multiplier for unchanged zones
+    :param float jitter: Relative random spread of intervals
+    :param int workers: Maximum number of concurrent polls
+    :param AdaptiveLimiter limiter: Optional adaptive concurrency limit
+    """
+
+    def __init__(
+        self,
+        api,
+        domains,
+        callback=None,
+        min_interval=60,
+        max_interval=3600,
+        backoff=2.0,
+        jitter=0.1,
+        workers=4,
+        limiter=None,
+    ):
+        self.api = api
+        self.callback = callback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.workers = workers
+        self.limiter = limiter
+        self.zones = {}
+        self._queue = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        domains = list(domains)
+        # spread first polls evenly over the shortest interval
+        for i, domain in enumerate(domains):
+            self.add(domain, delay=i * min_interval / len(domains))
+
+    def add(self, domain, delay=None):
+        """
+        Start watching `domain`
+
+        :param float delay: Seconds until first poll, random up to
+            `min_interval` when omitted
+        """
+        if domain in self.zones:
+            return
+        if delay is None:
+            delay = random.uniform(0, self.min_interval)
+        zone = self.zones[domain] = _Zone(self.min_interval)
+        self._push(domain, zone, delay)
+
+    def _push(self, domain, zone, delay):
+        # entries of removed or rescheduled zones stay in the queue and
+        # are dropped when popped, see `_valid`
+        with self._lock:
+            zone.entry = next(self._sequence)
+            heapq.heappush(self._queue, (time.monotonic() + delay, zone.entry, domain))
+
+    def _valid(self, entry):
+        zone = self.zones.get(entry[2])
+        return zone is not None and zone.entry == entry[1]
+
+    def remove(self, domain):
+        """Stop watching `domain`"""
+        self.zones.pop(domain, None)
+
+    def interval(self, domain):
+        """Return current polling interval of `domain`"""
+        return self.zones[domain].interval
+
+    def poll(self, domain):
+        """
+        Poll single zone and update its interval.
+
+        :return :class:`ZoneChange` or None when the zone is unchanged
+            or polled for the first time
+        """
+        zone = self.zones[domain]
+        snapshot, digest = _snapshot(self.api.get_dns_zone(domain))
+        change = None
+        if zone.hash is not None and digest != zone.hash:
+            change = diff_zone(domain, zone.snapshot, snapshot)
+            zone.interval = self.min_interval
+        elif zone.hash is not None:
+            zone.interval = min(self.max_interval, zone.interval * self.backoff)
+        zone.snapshot, zone.hash = snapshot, digest
+        return change
+
+    def _schedule(self, domain, zone):
+        spread = 1 + random.uniform(-self.jitter, self.jitter)
+        self._push(domain, zone, zone.interval * spread)
+
+    def poll_due(self):
+        """
+        Poll all zones which are due now.
+
+        :return list of :class:`ZoneChange`
+        """
+        now = time.monotonic()
+        due = {}
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now:
+                entry = heapq.heappop(self._queue)
+                if self._valid(entry):
+                    due[entry[2]] = self.zones[entry[2]]
+
+        changes = []
+        for result in run_parallel(
+            self.poll, list(due), workers=self.workers, limiter=self.limiter
+        ):
+            zone = due[result.item]
+            # failed polls are retried after the shortest interval
+            if result.error is not None:
+                zone.interval = self.min_interval
+            elif result.result is not None:
+                changes.append(result.result)
+                if self.callback:
+                    self.callback(result.result)
+            # the zone may have been removed (and added again) meanwhile
+            if self.zones.get(result.item) is zone:
+                self._schedule(result.item, zone)
+        return changes
+
+    def next_due(self):
+        """Return seconds until next zone is due, None when nothing is watched"""
+        with self._lock:
+            while self._queue and not self._valid(self._queue[0]):
+                heapq.heappop(self._queue)
+            if not self._queue:
+                return None
+            return max(0.0, self._queue[0][0] - time.monotonic())
+
+    def run(self, stop=None):
+        """
+        Poll zones until `stop` event is set.
+
+        :param threading.Event stop: Stop event, run forever when omitted
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            wait = self.next_due()
+            if wait is None:
+                break
+            if stop.wait(wait):
+                break
+            self.poll_due()